@@ -5,24 +5,56 @@ Add your Instagram coffee posts manually with this helper script
 """
 
 import re
+import os
+import sys
 import json
+import random
 from datetime import datetime
 from pathlib import Path
 
+_HASHTAG_RE = re.compile(r'#\w+\s*')
+_BLANK_LINES_RE = re.compile(r'\n\n+')
+_NONWORD_RE = re.compile(r'[^\w\s-]')
+_DASH_RE = re.compile(r'[-\s]+')
+
+# Placeholder images
+_PLACEHOLDER_IMAGES = (
+    "https://images.unsplash.com/photo-1545665225-b23b99e4d45e?w=800",
+    "https://images.unsplash.com/photo-1514432324607-a09d9b4aefdd?w=800",
+    "https://images.unsplash.com/photo-1495474472287-4d71bcdd2085?w=800",
+    "https://images.unsplash.com/photo-1461023058943-07fcbe16d735?w=800",
+    "https://images.unsplash.com/photo-1558591710-4bac9de5d604?w=800",
+)
+
+REGIONS = {
+    'Europe': ['france', 'italy', 'spain', 'germany', 'uk', 'greece', 'portugal', 'netherlands', 'belgium', 'switzerland', 'austria', 'czech', 'hungary', 'poland', 'denmark', 'sweden', 'norway', 'ireland', 'paris', 'london', 'rome', 'berlin', 'amsterdam', 'barcelona', 'vienna', 'prague', 'lisbon', 'madrid', 'athens', 'budapest', 'copenhagen', 'dublin'],
+    'Asia': ['japan', 'china', 'korea', 'thailand', 'vietnam', 'indonesia', 'singapore', 'malaysia', 'philippines', 'india', 'tokyo', 'kyoto', 'osaka', 'seoul', 'bangkok', 'hong kong', 'taipei', 'shanghai', 'beijing', 'delhi', 'mumbai', 'saigon', 'ho chi minh'],
+    'Americas': ['usa', 'united states', 'canada', 'mexico', 'brazil', 'argentina', 'colombia', 'peru', 'chile', 'new york', 'portland', 'seattle', 'san francisco', 'los angeles', 'chicago', 'boston', 'miami', 'mexico city', 'buenos aires', 'são paulo', 'rio'],
+    'Oceania': ['australia', 'new zealand', 'melbourne', 'sydney', 'auckland', 'wellington', 'brisbane', 'perth'],
+    'Africa': ['south africa', 'morocco', 'egypt', 'kenya', 'ethiopia', 'tanzania', 'cape town', 'marrakech', 'cairo', 'nairobi', 'johannesburg']
+}
+
+# Keyword -> region for bare names, plus one alternation per region so a
+# location is scanned once per region instead of once per keyword. Regions
+# are tried in REGIONS order, so 'Perugia, Italy' is Europe even though
+# 'peru' appears earlier in the string.
+_KEYWORD_REGION = {loc.lower(): region for region, locations in REGIONS.items() for loc in locations}
+_REGION_RES = tuple(
+    (region, re.compile('|'.join(re.escape(loc) for loc in locations)))
+    for region, locations in REGIONS.items()
+)
+
 def get_region(location):
     """Determine region from location"""
-    location_lower = location.lower()
-    
-    regions = {
-        'Europe': ['france', 'italy', 'spain', 'germany', 'uk', 'greece', 'portugal', 'netherlands', 'belgium', 'switzerland', 'austria', 'czech', 'hungary', 'poland', 'denmark', 'sweden', 'norway', 'ireland', 'paris', 'london', 'rome', 'berlin', 'amsterdam', 'barcelona', 'vienna', 'prague', 'lisbon', 'madrid', 'athens', 'budapest', 'copenhagen', 'dublin'],
-        'Asia': ['japan', 'china', 'korea', 'thailand', 'vietnam', 'indonesia', 'singapore', 'malaysia', 'philippines', 'india', 'tokyo', 'kyoto', 'osaka', 'seoul', 'bangkok', 'hong kong', 'taipei', 'shanghai', 'beijing', 'delhi', 'mumbai', 'saigon', 'ho chi minh'],
-        'Americas': ['usa', 'united states', 'canada', 'mexico', 'brazil', 'argentina', 'colombia', 'peru', 'chile', 'new york', 'portland', 'seattle', 'san francisco', 'los angeles', 'chicago', 'boston', 'miami', 'mexico city', 'buenos aires', 'são paulo', 'rio'],
-        'Oceania': ['australia', 'new zealand', 'melbourne', 'sydney', 'auckland', 'wellington', 'brisbane', 'perth'],
-        'Africa': ['south africa', 'morocco', 'egypt', 'kenya', 'ethiopia', 'tanzania', 'cape town', 'marrakech', 'cairo', 'nairobi', 'johannesburg']
-    }
-    
-    for region, locations in regions.items():
-        if any(loc in location_lower for loc in locations):
+    location_lower = location.lower().strip()
+    
+    # Bare country/city names resolve with a single dict lookup
+    region = _KEYWORD_REGION.get(location_lower)
+    if region:
+        return region
+    
+    for region, pattern in _REGION_RES:
+        if pattern.search(location_lower):
             return region
     return 'World'
 
@@ -59,23 +91,22 @@ def create_post():
     
     # Post content
     print("\n📝 POST CONTENT:")
-    print("Paste your Instagram caption (press Enter twice when done):")
+    print("Paste your Instagram caption (finish with a line containing only '.', or Ctrl-D):")
     lines = []
-    while True:
-        line = input()
-        if line == '' and lines and lines[-1] == '':
+    for line in iter(sys.stdin.readline, ''):
+        if line.rstrip('\n') == '.':
             break
         lines.append(line)
     
-    caption = '\n'.join(lines).strip()
+    caption = ''.join(lines).strip()
     
     # Extract title from caption or create one
     title_lines = [line.strip() for line in caption.split('\n') if line.strip() and not line.strip().startswith('#')]
     title = title_lines[0][:50] if title_lines else f"Coffee in {city}"
     
     # Clean notes (remove hashtags)
-    notes = re.sub(r'#\w+\s*', '', caption).strip()
-    notes = re.sub(r'\n\n+', '\n', notes).strip()
+    notes = _HASHTAG_RE.sub('', caption).strip()
+    notes = _BLANK_LINES_RE.sub('\n', notes).strip()
     
     # Date
     print("\n📅 DATE:")
@@ -93,16 +124,7 @@ def create_post():
     if image_choice == '1':
         image_url = input("Image URL: ").strip()
     else:
-        # Placeholder images
-        placeholders = [
-            "https://images.unsplash.com/photo-1545665225-b23b99e4d45e?w=800",
-            "https://images.unsplash.com/photo-1514432324607-a09d9b4aefdd?w=800",
-            "https://images.unsplash.com/photo-1495474472287-4d71bcdd2085?w=800",
-            "https://images.unsplash.com/photo-1461023058943-07fcbe16d735?w=800",
-            "https://images.unsplash.com/photo-1558591710-4bac9de5d604?w=800",
-        ]
-        import random
-        image_url = random.choice(placeholders)
+        image_url = random.choice(_PLACEHOLDER_IMAGES)
     
     # Instagram URL
     instagram_url = input("\nInstagram post URL (optional): ").strip() or "https://www.instagram.com/p/example/"
@@ -111,8 +133,8 @@ def create_post():
     region = get_region(f"{city} {country}")
     
     # Create filename
-    slug = re.sub(r'[^\w\s-]', '', title.lower())
-    slug = re.sub(r'[-\s]+', '-', slug)[:30]
+    slug = _NONWORD_RE.sub('', title.lower())
+    slug = _DASH_RE.sub('-', slug)[:30]
     filename = f"{date_str}-{slug}.md"
     
     # Create post content
@@ -192,10 +214,11 @@ Choose an option:
     elif choice == '3':
         posts_dir = Path("_coffee_posts")
         if posts_dir.exists():
-            posts = sorted(posts_dir.glob("*.md"), reverse=True)
+            with os.scandir(posts_dir) as entries:
+                posts = sorted((entry.name for entry in entries if entry.name.endswith('.md')), reverse=True)
             print(f"\n📝 Found {len(posts)} posts:")
             for post in posts[:10]:  # Show last 10
-                print(f"  - {post.name}")
+                print(f"  - {post}")
             if len(posts) > 10:
                 print(f"  ... and {len(posts) - 10} more")
         else:
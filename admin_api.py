@@ -4,7 +4,8 @@ Simple API server for coffee post admin interface
 Works directly with SQLite database
 """
 
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from concurrent.futures import ThreadPoolExecutor
 import json
 import urllib.parse
 from pathlib import Path
@@ -12,7 +13,69 @@ import subprocess
 import os
 from coffee_db import CoffeeDatabase
 import threading
-import time
+import functools
+import queue
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Number of threads serving requests; each keeps its own database connection
+SERVER_WORKERS = 8
+
+# One CoffeeDatabase connection per server thread, reused across requests
+_tls = threading.local()
+
+def get_db():
+    """Return this thread's database connection, opening it on first use"""
+    db = getattr(_tls, 'db', None)
+    if db is None:
+        _tls.db = db = CoffeeDatabase()
+    return db
+
+# Full regenerations run one at a time on a single long-lived worker thread,
+# started by main(). Requests that arrive while one is already queued
+# collapse into it; the lock makes the check-and-queue atomic.
+_regen_queue = queue.Queue()
+_regen_all_pending = threading.Event()
+_regen_lock = threading.Lock()
+
+def _regeneration_worker():
+    from regenerate_posts import regenerate_all_posts
+    while True:
+        _regen_queue.get()
+        # Clear before running so a request made mid-run queues a fresh pass
+        with _regen_lock:
+            _regen_all_pending.clear()
+        try:
+            regenerate_all_posts(backup=False)
+        except Exception as e:
+            print(f"❌ Regeneration failed: {e}")
+        finally:
+            _regen_queue.task_done()
+
+def queue_full_regeneration():
+    """Schedule a full regeneration; returns False if one is already queued"""
+    with _regen_lock:
+        if _regen_all_pending.is_set():
+            return False
+        _regen_all_pending.set()
+        _regen_queue.put('all')
+    return True
+
+def encode_json(data):
+    """Encode a response payload as JSON bytes"""
+    # CoffeeDatabase doesn't enable detect_types, so TIMESTAMP columns already
+    # arrive as ISO strings and no default= fallback is needed
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data).encode('utf-8')
+
+@functools.lru_cache(maxsize=256)
+def search_response(query):
+    """Encoded /api/search results, cached per query until a post changes"""
+    return encode_json(get_db().search_posts(query))
 
 class CoffeeAdminHandler(SimpleHTTPRequestHandler):
     def __init__(self, *args, **kwargs):
@@ -38,7 +101,7 @@ class CoffeeAdminHandler(SimpleHTTPRequestHandler):
     
     def handle_api_get(self):
         try:
-            db = CoffeeDatabase()
+            db = get_db()
             
             if self.path == '/api/posts':
                 # Get all posts
@@ -64,16 +127,13 @@ class CoffeeAdminHandler(SimpleHTTPRequestHandler):
                 query_params = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
                 query = query_params.get('q', [''])[0]
                 if query:
-                    results = db.search_posts(query)
-                    self.send_json_response(results)
+                    self.send_json_body(search_response(query))
                 else:
                     self.send_json_response([])
             
             else:
                 self.send_error(404)
             
-            db.close()
-            
         except Exception as e:
             self.send_error(500, str(e))
     
@@ -82,13 +142,11 @@ class CoffeeAdminHandler(SimpleHTTPRequestHandler):
             # Handle regenerate endpoint without requiring JSON data
             if self.path == '/api/regenerate':
                 # Regenerate all posts
-                def regenerate_async():
-                    time.sleep(0.1)  # Small delay to send response first
-                    from regenerate_posts import regenerate_all_posts
-                    regenerate_all_posts(backup=False)
-                
-                threading.Thread(target=regenerate_async).start()
-                self.send_json_response({'success': True, 'message': 'Regeneration started'})
+                if queue_full_regeneration():
+                    message = 'Regeneration started'
+                else:
+                    message = 'Regeneration already queued'
+                self.send_json_response({'success': True, 'message': message})
                 return
             
             # For other endpoints, parse JSON data
@@ -96,11 +154,12 @@ class CoffeeAdminHandler(SimpleHTTPRequestHandler):
             post_data = self.rfile.read(content_length)
             data = json.loads(post_data.decode('utf-8'))
             
-            db = CoffeeDatabase()
+            db = get_db()
             
             if self.path == '/api/posts':
                 # Create new post
                 post_id, action = db.upsert_post(data)
+                search_response.cache_clear()
                 # Regenerate the single post
                 from single_post_regenerator import regenerate_single_post
                 regen_success, regen_message = regenerate_single_post(post_id)
@@ -116,6 +175,7 @@ class CoffeeAdminHandler(SimpleHTTPRequestHandler):
                 post_id = int(self.path.split('/')[-2])
                 success = db.update_post(post_id, data)
                 if success:
+                    search_response.cache_clear()
                     # Regenerate the single post
                     from single_post_regenerator import regenerate_single_post
                     regen_success, regen_message = regenerate_single_post(post_id)
@@ -136,6 +196,7 @@ class CoffeeAdminHandler(SimpleHTTPRequestHandler):
                 # Then delete from database
                 success = db.delete_post(post_id)
                 if success:
+                    search_response.cache_clear()
                     self.send_json_response({
                         'success': True,
                         'file_removed': remove_success,
@@ -148,8 +209,6 @@ class CoffeeAdminHandler(SimpleHTTPRequestHandler):
             else:
                 self.send_error(404)
             
-            db.close()
-            
         except Exception as e:
             self.send_error(500, str(e))
     
@@ -160,7 +219,7 @@ class CoffeeAdminHandler(SimpleHTTPRequestHandler):
             post_data = self.rfile.read(content_length)
             data = json.loads(post_data.decode('utf-8'))
             
-            db = CoffeeDatabase()
+            db = get_db()
             
             if self.path.startswith('/api/posts/') and not '/update' in self.path:
                 # Update publish status: PUT /api/posts/{id}
@@ -170,6 +229,7 @@ class CoffeeAdminHandler(SimpleHTTPRequestHandler):
                 if 'published' in data:
                     success = db.update_post(post_id, data)
                     if success:
+                        search_response.cache_clear()
                         # Regenerate the single post if it's now published
                         from single_post_regenerator import regenerate_single_post
                         regen_success, regen_message = regenerate_single_post(post_id)
@@ -186,19 +246,21 @@ class CoffeeAdminHandler(SimpleHTTPRequestHandler):
             else:
                 self.send_error(404)
             
-            db.close()
-            
         except Exception as e:
             self.send_error(500, str(e))
     
     def send_json_response(self, data):
+        self.send_json_body(encode_json(data))
+    
+    def send_json_body(self, body):
         self.send_response(200)
         self.send_header('Content-Type', 'application/json')
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, PUT, DELETE, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Content-Length', str(len(body)))
         self.end_headers()
-        self.wfile.write(json.dumps(data, indent=2, default=str).encode('utf-8'))
+        self.wfile.write(body)
     
     def do_OPTIONS(self):
         self.send_response(200)
@@ -207,9 +269,27 @@ class CoffeeAdminHandler(SimpleHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
         self.end_headers()
 
+class PooledHTTPServer(ThreadingHTTPServer):
+    """Serves requests on a fixed pool of threads rather than a new thread each
+    
+    Pool threads live for the whole server, so the per-thread database
+    connection from get_db is opened once and reused by every request.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.executor = ThreadPoolExecutor(max_workers=SERVER_WORKERS)
+    
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_request_thread, request, client_address)
+    
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
 def main():
     port = 8081
-    server = HTTPServer(('localhost', port), CoffeeAdminHandler)
+    threading.Thread(target=_regeneration_worker, daemon=True).start()
+    server = PooledHTTPServer(('localhost', port), CoffeeAdminHandler)
     print(f"🚀 Coffee Admin API server running at http://localhost:{port}")
     print("📝 Database-driven admin interface ready!")
     
@@ -217,7 +297,7 @@ def main():
         server.serve_forever()
     except KeyboardInterrupt:
         print("\n🛑 Server stopped")
-        server.shutdown()
+        server.server_close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
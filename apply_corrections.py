@@ -6,79 +6,42 @@ Apply corrections to existing coffee posts without re-processing Instagram data
 import json
 import re
 import os
+import sys
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from datetime import datetime
+from datetime import date, datetime
 
-def yaml_safe_string(text):
-    """Make a string safe for YAML by properly escaping it"""
-    if not text:
-        return '""'
-    
-    # Clean up the text first
-    text = str(text)
-    
-    # Fix UTF-8 encoding issues first - handle byte sequences
-    byte_replacements = {
-        '\u0080\u0099': "'",  # I€™ve -> I've
-        '\u0080\u009c': '"',  # Left double quote
-        '\u0080\u009d': '"',  # Right double quote
-        '\u0080\u0094': '-',  # Em dash
-        '\u0080\u0093': '-',  # En dash
-        'â\u0080\u0099': "'", # Another variant
-        'â\u0080\u009c': '"',
-        'â\u0080\u009d': '"',
-        'â\u0080\u0094': '-',
-        'â\u0080\u0093': '-',
-    }
-    
-    for wrong, right in byte_replacements.items():
-        text = text.replace(wrong, right)
-    
-    # Handle common character encoding problems from Instagram export
-    char_replacements = {
-        'â': "'",          # â often means '
-        'â': '"',          # â often means "
-        'â': '"',          # â often means "
-        'â': '-',          # â often means -
-        'â': '-',          # â often means -
-        'Â': '',           # Â is often a stray character
-        'Ã¡': 'a',         # á encoded incorrectly
-        'Ã©': 'e',         # é encoded incorrectly
-        'Ã­': 'i',         # í encoded incorrectly
-        'Ã³': 'o',         # ó encoded incorrectly
-        'Ãº': 'u',         # ú encoded incorrectly
-        'Ã±': 'ñ',         # ñ encoded incorrectly
-    }
-    
-    for wrong, right in char_replacements.items():
-        text = text.replace(wrong, right)
-    
-    # Handle quotes and special characters for YAML
-    if '"' in text or "'" in text or ':' in text or '\n' in text or text.startswith(' ') or text.endswith(' '):
-        # Escape internal quotes and wrap in quotes
-        escaped = text.replace('"', '\\"')
-        return f'"{escaped}"'
-    
-    return text
+import yaml
+
+from post_io import (
+    find_correction_key, get_post_files, index_corrections_by_timestamp,
+    load_front_matter, validate_front_matter, write_post, yaml_safe_string,
+)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+@functools.lru_cache(maxsize=4)
+def _load_corrections_file(path, mtime_ns):
+    """Parse a corrections file; cached per (path, mtime) so re-runs skip the parse"""
+    raw = Path(path).read_bytes()
+    data = orjson.loads(raw) if orjson is not None else json.loads(raw)
+    # Remove metadata fields starting with _
+    return {k: v for k, v in data.items() if not k.startswith('_')}
 
 def load_corrections():
     """Load manual corrections from JSON file"""
     corrections_file = Path("post-corrections.json")
-    if corrections_file.exists():
-        with open(corrections_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        # Remove metadata fields starting with _
-        return {k: v for k, v in data.items() if not k.startswith('_')}
-    return {}
-
-def get_post_files():
-    """Get all existing post files"""
-    posts_dir = Path("_coffee_posts")
-    if not posts_dir.exists():
-        print("❌ No _coffee_posts directory found!")
-        return []
-    
-    return list(posts_dir.glob("*.md"))
+    try:
+        mtime_ns = corrections_file.stat().st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    # Hand out a shallow copy so callers can't modify the cached dict
+    return dict(_load_corrections_file(str(corrections_file.resolve()), mtime_ns))
 
 def parse_front_matter(content):
     """Parse YAML front matter from markdown content"""
@@ -93,90 +56,120 @@ def parse_front_matter(content):
     front_matter_text = content[4:end_pos]
     body = content[end_pos + 5:]  # Skip the closing ---\n
     
-    # Parse YAML manually (simple key: value parsing)
-    front_matter = {}
-    for line in front_matter_text.split('\n'):
-        line = line.strip()
-        if ':' in line and not line.startswith('#'):
-            key, value = line.split(':', 1)
-            key = key.strip()
-            value = value.strip()
-            
-            # Remove quotes if present
-            if value.startswith('"') and value.endswith('"'):
-                value = value[1:-1]
-            elif value.startswith("'") and value.endswith("'"):
-                value = value[1:-1]
-            
-            # Convert numeric values
-            if value.replace('.', '').replace('-', '').isdigit():
-                if '.' in value:
-                    front_matter[key] = float(value)
-                else:
-                    front_matter[key] = int(value)
-            elif value.lower() in ['true', 'false']:
-                front_matter[key] = value.lower() == 'true'
-            else:
-                front_matter[key] = value
+    return load_front_matter(front_matter_text), body
+
+def read_post(post_file):
+    """Read a post, stopping the front matter scan at the closing --- line"""
+    with open(post_file, 'rb') as f:
+        first_line = f.readline()
+        if first_line != b'---\n':
+            return {}, (first_line + f.read()).decode('utf-8')
+        
+        header_lines = []
+        for line in f:
+            if line == b'---\n':
+                break
+            header_lines.append(line)
+        else:
+            # No closing marker - treat the whole file as body
+            return {}, (first_line + b''.join(header_lines)).decode('utf-8')
+        
+        body = f.read().decode('utf-8')
     
-    return front_matter, body
+    return load_front_matter(b''.join(header_lines).decode('utf-8')), body
+
+# Standard fields in order, with their "key: " prefixes built once
+_FIELD_ORDER = (
+    'layout', 'title', 'date', 'city', 'country', 'continent',
+    'latitude', 'longitude', 'cafe_name', 'rating', 'notes',
+    'image_url', 'images', 'instagram_url'
+)
+_FIELD_PREFIXES = tuple((field, f'{field}: ', f'{field}:') for field in _FIELD_ORDER)
 
 def generate_front_matter(data):
     """Generate YAML front matter from data dict"""
     lines = ['---']
     
-    # Standard fields in order
-    field_order = [
-        'layout', 'title', 'date', 'city', 'country', 'continent',
-        'latitude', 'longitude', 'cafe_name', 'rating', 'notes',
-        'image_url', 'images', 'instagram_url'
-    ]
-    
     # Add ordered fields
-    for field in field_order:
-        if field in data and data[field] is not None:
-            value = data[field]
-            if isinstance(value, str):
-                lines.append(f'{field}: {yaml_safe_string(value)}')
-            elif isinstance(value, (int, float)):
-                lines.append(f'{field}: {value}')
-            elif isinstance(value, list):
-                if value:  # Only add if list is not empty
-                    lines.append(f'{field}:')
-                    for item in value:
-                        lines.append(f'  - {yaml_safe_string(str(item))}')
+    for field, prefix, list_header in _FIELD_PREFIXES:
+        value = data.get(field)
+        if value is None:
+            continue
+        if isinstance(value, str):
+            lines.append(prefix + yaml_safe_string(value))
+        elif isinstance(value, (int, float, date)):
+            lines.append(prefix + str(value))
+        elif isinstance(value, list):
+            if value:  # Only add if list is not empty
+                lines.append(list_header)
+                lines.extend('  - ' + yaml_safe_string(str(item)) for item in value)
     
     lines.append('---')
     return '\n'.join(lines) + '\n'
 
-def validate_yaml_content(filepath):
-    """Validate that a file can be parsed as Jekyll post"""
+_print_lock = threading.Lock()
+
+def log(message):
+    """Print from worker threads without interleaving lines"""
+    with _print_lock:
+        print(message)
+
+def apply_correction_to_post(post_file, corrections, by_timestamp, corrections_mtime_ns=None):
+    """Apply the matching correction to a single post file
+    
+    Returns (correction_key, applied). correction_key is None if nothing
+    matched; applied is False when the post was skipped, e.g. because it
+    was written after the corrections file last changed.
+    """
+    # Work out which correction applies before touching the file, so
+    # posts without corrections are never read
+    correction_key = find_correction_key(post_file, corrections, by_timestamp)
+    if not correction_key:
+        return None, False
+    
+    # Posts written since the corrections file last changed already have them
+    if corrections_mtime_ns is not None and post_file.stat().st_mtime_ns > corrections_mtime_ns:
+        return correction_key, False
+    
+    # Read the file and parse front matter
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-            
-        # Check for basic YAML structure
-        if not content.startswith('---\n'):
-            return False, "Missing YAML front matter"
-            
-        # Find end of front matter
-        end_pos = content.find('\n---\n', 4)
-        if end_pos == -1:
-            return False, "Incomplete YAML front matter"
-            
-        # Check for control characters in title and content
-        lines = content[:end_pos + 5].split('\n')
-        for line in lines:
-            if any(ord(c) < 32 and c not in '\n\t' for c in line):
-                return False, f"Control characters in YAML: {repr(line[:50])}"
-                
-        return True, "Valid"
-        
-    except Exception as e:
-        return False, f"Error reading file: {e}"
+        front_matter, body = read_post(post_file)
+    except yaml.YAMLError as e:
+        log(f"   ⚠️  Skipping {post_file.name}: invalid YAML front matter ({e})")
+        return None, False
+    
+    match_note = '' if correction_key == f"coffee/{post_file.stem}" else ' (timestamp match)'
+    
+    # Apply corrections to front matter
+    correction = corrections[correction_key]
+    for key, value in correction.items():
+        front_matter[key] = value
+    
+    # Regenerate the file with corrections
+    new_front_matter = generate_front_matter(front_matter)
+    
+    # Validate in memory so an invalid post is never written
+    is_valid, error_msg = validate_front_matter(new_front_matter)
+    if not is_valid:
+        log(f"   ⚠️  Warning: Not writing invalid file {post_file.name}: {error_msg}")
+        return None, False
+    
+    log(f"   ✅ Applying corrections to: {post_file.name}{match_note}")
+    new_content = new_front_matter + body
+    
+    # Write the corrected file
+    write_post(post_file, new_content)
+    
+    return correction_key, True
 
-def apply_corrections_to_posts():
-    """Apply corrections to existing posts"""
+def apply_corrections_to_posts(skip_newer=False):
+    """Apply corrections to existing posts
+    
+    With skip_newer set, posts modified after post-corrections.json are
+    assumed to be up to date and are left alone. That only holds when this
+    script wrote them last - regenerated or freshly checked out posts are
+    newer too - so it is off by default.
+    """
     corrections = load_corrections()
     if not corrections:
         print("📝 No corrections found in post-corrections.json")
@@ -191,80 +184,36 @@ def apply_corrections_to_posts():
     
     print(f"📁 Found {len(post_files)} post files")
     
-    applied_count = 0
+    by_timestamp = index_corrections_by_timestamp(corrections)
+    corrections_mtime_ns = Path("post-corrections.json").stat().st_mtime_ns if skip_newer else None
     
-    for post_file in post_files:
-        # Read the file
-        with open(post_file, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Parse front matter
-        front_matter, body = parse_front_matter(content)
-        
-        # Generate post key from URL-like structure
-        # Convert filename to URL format for matching
-        filename_stem = post_file.stem
-        post_key = f"coffee/{filename_stem}"
-        
-        # Check if this post has corrections
-        if post_key in corrections:
-            print(f"   ✅ Applying corrections to: {post_file.name}")
-            
-            # Apply corrections to front matter
-            correction = corrections[post_key]
-            for key, value in correction.items():
-                front_matter[key] = value
-            
-            # Regenerate the file with corrections
-            new_front_matter = generate_front_matter(front_matter)
-            new_content = new_front_matter + body
-            
-            # Write the corrected file
-            with open(post_file, 'w', encoding='utf-8') as f:
-                f.write(new_content)
-                
-            # Validate the written file
-            is_valid, error_msg = validate_yaml_content(post_file)
-            if not is_valid:
-                print(f"   ⚠️  Warning: Created invalid file {post_file.name}: {error_msg}")
-            
-            applied_count += 1
-        else:
-            # Try alternative matching strategies
-            
-            # Method 1: Try matching by timestamp in filename
-            timestamp_match = re.search(r'-(\d{10})\.md$', str(post_file))
-            if timestamp_match:
-                timestamp = timestamp_match.group(1)
-                for correction_key in corrections.keys():
-                    if timestamp in correction_key:
-                        print(f"   ✅ Applying corrections to: {post_file.name} (timestamp match)")
-                        correction = corrections[correction_key]
-                        for key, value in correction.items():
-                            front_matter[key] = value
-                        
-                        new_front_matter = generate_front_matter(front_matter)
-                        new_content = new_front_matter + body
-                        
-                        with open(post_file, 'w', encoding='utf-8') as f:
-                            f.write(new_content)
-                        
-                        applied_count += 1
-                        break
+    # Each post is independent, so overlap the file I/O across a thread pool
+    apply_one = functools.partial(
+        apply_correction_to_post,
+        corrections=corrections,
+        by_timestamp=by_timestamp,
+        corrections_mtime_ns=corrections_mtime_ns,
+    )
+    max_workers = min(32, (os.cpu_count() or 1) * 4)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = [(key, applied) for key, applied in executor.map(apply_one, post_files) if key]
+    
+    applied_count = sum(1 for _, applied in results if applied)
+    up_to_date_count = len(results) - applied_count
+    matched_keys = {key for key, _ in results}
+    
+    # Flush all rewritten posts to disk once rather than per file
+    if applied_count and hasattr(os, 'sync'):
+        os.sync()
     
     print(f"\n✅ Applied corrections to {applied_count} posts")
-    print(f"📊 {len(corrections) - applied_count} corrections could not be matched to posts")
+    if up_to_date_count:
+        print(f"⏭️  Skipped {up_to_date_count} posts already newer than post-corrections.json (run without --skip-newer to reapply)")
+    unmatched = set(corrections.keys()) - matched_keys
+    print(f"📊 {len(unmatched)} corrections could not be matched to posts")
     
-    if applied_count < len(corrections):
+    if unmatched:
         print(f"\n💡 Unmatched corrections:")
-        matched_keys = set()
-        for post_file in post_files:
-            filename_stem = post_file.stem
-            post_key = f"coffee/{filename_stem}"
-            if post_key in corrections:
-                matched_keys.add(post_key)
-        
-        unmatched = set(corrections.keys()) - matched_keys
         for key in sorted(unmatched):
             print(f"   - {key}")
 
@@ -287,7 +236,7 @@ This script applies corrections from post-corrections.json to existing posts
         print("💡 Run the main processing script first to create posts")
         return
     
-    apply_corrections_to_posts()
+    apply_corrections_to_posts(skip_newer='--skip-newer' in sys.argv)
     
     print(f"""
 🎉 Corrections Applied Successfully!
@@ -7,177 +7,156 @@ import json
 import re
 import os
 import sys
+import mmap
+import functools
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from datetime import datetime
+from datetime import date, datetime
+import yaml
 from post_corrections_db import PostCorrectionsDB
+from post_io import (
+    find_correction_key, get_post_files, index_corrections_by_timestamp,
+    load_front_matter, validate_front_matter, write_post, yaml_safe_string,
+)
 
-def yaml_safe_string(text):
-    """Make a string safe for YAML by properly escaping it"""
-    if not text:
-        return '""'
-    
-    # Clean up the text first
-    text = str(text)
-    
-    # Fix UTF-8 encoding issues first - handle byte sequences
-    byte_replacements = {
-        '\u0080\u0099': "'",  # I€™ve -> I've
-        '\u0080\u009c': '"',  # Left double quote
-        '\u0080\u009d': '"',  # Right double quote
-        '\u0080\u0094': '-',  # Em dash
-        '\u0080\u0093': '-',  # En dash
-        'â\u0080\u0099': "'", # Another variant
-        'â\u0080\u009c': '"',
-        'â\u0080\u009d': '"',
-        'â\u0080\u0094': '-',
-        'â\u0080\u0093': '-',
-    }
-    
-    for wrong, right in byte_replacements.items():
-        text = text.replace(wrong, right)
-    
-    # Handle common character encoding problems from Instagram export
-    char_replacements = {
-        'â': "'",          # â often means '
-        'â': '"',          # â often means "
-        'â': '"',          # â often means "
-        'â': '-',          # â often means -
-        'â': '-',          # â often means -
-        'Â': '',           # Â is often a stray character
-        'Ã¡': 'a',         # á encoded incorrectly
-        'Ã©': 'e',         # é encoded incorrectly
-        'Ã­': 'i',         # í encoded incorrectly
-        'Ã³': 'o',         # ó encoded incorrectly
-        'Ãº': 'u',         # ú encoded incorrectly
-        'Ã±': 'ñ',         # ñ encoded incorrectly
-    }
-    
-    for wrong, right in char_replacements.items():
-        text = text.replace(wrong, right)
-    
-    # Handle quotes and special characters for YAML
-    if '"' in text or "'" in text or ':' in text or '\n' in text or text.startswith(' ') or text.endswith(' '):
-        # Escape internal quotes and wrap in quotes
-        escaped = text.replace('"', '\\"')
-        return f'"{escaped}"'
-    
-    return text
+@functools.lru_cache(maxsize=1)
+def _load_corrections_db(db_path, mtime_ns):
+    """Read every correction; cached per (path, mtime) so repeat loads skip the query"""
+    return PostCorrectionsDB(db_path).get_corrections()
 
 def load_corrections_from_db():
     """Load corrections from SQLite database"""
-    db = PostCorrectionsDB()
-    corrections = db.get_corrections()
+    db_path = Path("post_corrections.db")
+    try:
+        mtime_ns = db_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        mtime_ns = None  # PostCorrectionsDB creates it, so the next load re-reads
+    # Hand out a shallow copy so callers can't modify the cached dict
+    corrections = dict(_load_corrections_db(str(db_path.resolve()), mtime_ns))
     print(f"📝 Loaded {len(corrections)} corrections from SQLite database")
     return corrections
 
-def get_post_files():
-    """Get all existing post files"""
-    posts_dir = Path("_coffee_posts")
-    if not posts_dir.exists():
-        print("❌ No _coffee_posts directory found!")
-        return []
-    
-    return list(posts_dir.glob("*.md"))
-
-def parse_front_matter(content):
-    """Parse YAML front matter from markdown content"""
-    if not content.startswith('---\n'):
-        return {}, content
-    
-    # Find the end of front matter
-    end_pos = content.find('\n---\n', 4)
-    if end_pos == -1:
-        return {}, content
-    
-    front_matter_text = content[4:end_pos]
-    body = content[end_pos + 5:]  # Skip the closing ---\n
-    
-    # Parse YAML manually (simple key: value parsing)
-    front_matter = {}
-    for line in front_matter_text.split('\n'):
-        line = line.strip()
-        if ':' in line and not line.startswith('#'):
-            key, value = line.split(':', 1)
-            key = key.strip()
-            value = value.strip()
+def read_post(post_file):
+    """Read a post through mmap, decoding the front matter and body slices separately
+    
+    Returns (front_matter, body, header) where header is the original
+    front matter block including both --- lines, or '' if there is none.
+    """
+    with open(post_file, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return {}, '', ''
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:4] != b'---\n':
+                return {}, mm[:].decode('utf-8'), ''
             
-            # Remove quotes if present
-            if value.startswith('"') and value.endswith('"'):
-                value = value[1:-1]
-            elif value.startswith("'") and value.endswith("'"):
-                value = value[1:-1]
+            # Find the end of front matter
+            end_pos = mm.find(b'\n---\n', 4)
+            if end_pos == -1:
+                return {}, mm[:].decode('utf-8'), ''
             
-            # Convert numeric values
-            if value.replace('.', '').replace('-', '').isdigit():
-                if '.' in value:
-                    front_matter[key] = float(value)
-                else:
-                    front_matter[key] = int(value)
-            elif value.lower() in ['true', 'false']:
-                front_matter[key] = value.lower() == 'true'
-            else:
-                front_matter[key] = value
+            # end_pos is a byte offset, so slice the bytes before decoding
+            header = mm[:end_pos + 5].decode('utf-8')
+            front_matter_text = mm[4:end_pos].decode('utf-8')
+            body = mm[end_pos + 5:].decode('utf-8')  # Skip the closing ---\n
     
-    return front_matter, body
+    return load_front_matter(front_matter_text), body, header
+
+# Standard fields in order, with their "key: " prefixes built once
+_FIELD_ORDER = (
+    'layout', 'title', 'date', 'city', 'country', 'continent',
+    'latitude', 'longitude', 'cafe_name', 'rating', 'notes',
+    'image_url', 'images', 'instagram_url', 'published'
+)
+_FIELD_PREFIXES = tuple((field, f'{field}: ', f'{field}:') for field in _FIELD_ORDER)
 
 def generate_front_matter(data):
     """Generate YAML front matter from data dict"""
     lines = ['---']
     
-    # Standard fields in order
-    field_order = [
-        'layout', 'title', 'date', 'city', 'country', 'continent',
-        'latitude', 'longitude', 'cafe_name', 'rating', 'notes',
-        'image_url', 'images', 'instagram_url', 'published'
-    ]
-    
     # Add ordered fields
-    for field in field_order:
-        if field in data and data[field] is not None:
-            value = data[field]
-            if isinstance(value, str):
-                lines.append(f'{field}: {yaml_safe_string(value)}')
-            elif isinstance(value, bool):
-                lines.append(f'{field}: {str(value).lower()}')
-            elif isinstance(value, (int, float)):
-                lines.append(f'{field}: {value}')
-            elif isinstance(value, list):
-                if value:  # Only add if list is not empty
-                    lines.append(f'{field}:')
-                    for item in value:
-                        lines.append(f'  - {yaml_safe_string(str(item))}')
+    for field, prefix, list_header in _FIELD_PREFIXES:
+        value = data.get(field)
+        if value is None:
+            continue
+        if isinstance(value, str):
+            lines.append(prefix + yaml_safe_string(value))
+        elif isinstance(value, bool):
+            lines.append(prefix + ('true' if value else 'false'))
+        elif isinstance(value, (int, float, date)):
+            lines.append(prefix + str(value))
+        elif isinstance(value, list):
+            if value:  # Only add if list is not empty
+                lines.append(list_header)
+                lines.extend('  - ' + yaml_safe_string(str(item)) for item in value)
     
     lines.append('---')
     return '\n'.join(lines) + '\n'
 
-def validate_yaml_content(filepath):
-    """Validate that a file can be parsed as Jekyll post"""
+def apply_correction_to_post(post_file, correction, match_note='', silent=False):
+    """Apply one correction to a single post file; returns True if it was applied"""
+    # Read the file and parse its front matter
     try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-            
-        # Check for basic YAML structure
-        if not content.startswith('---\n'):
-            return False, "Missing YAML front matter"
-            
-        # Find end of front matter
-        end_pos = content.find('\n---\n', 4)
-        if end_pos == -1:
-            return False, "Incomplete YAML front matter"
-            
-        # Check for control characters in title and content
-        lines = content[:end_pos + 5].split('\n')
-        for line in lines:
-            if any(ord(c) < 32 and c not in '\n\t' for c in line):
-                return False, f"Control characters in YAML: {repr(line[:50])}"
-                
-        return True, "Valid"
-        
+        front_matter, body, old_header = read_post(post_file)
+    except yaml.YAMLError as e:
+        if not silent:
+            print(f"❌ Invalid YAML front matter in {post_file.name}: {e}")
+        return False
     except Exception as e:
-        return False, f"Error reading file: {e}"
+        if not silent:
+            print(f"❌ Error reading {post_file.name}: {e}")
+        return False
+    
+    # Apply corrections to front matter
+    for key, value in correction.items():
+        if value is not None:  # Only apply non-null values
+            # Convert SQLite boolean integers back to proper booleans for Jekyll
+            if key == 'published':
+                front_matter[key] = bool(value)
+            else:
+                front_matter[key] = value
+    
+    # Regenerate the file with corrections
+    new_front_matter = generate_front_matter(front_matter)
+    
+    # Nothing to write if the post already carries these corrections
+    if new_front_matter == old_header:
+        if not silent:
+            print(f"   ⏭️  Already up to date: {post_file.name}{match_note}")
+        return True
+    
+    # Validate in memory so an invalid post is never written
+    is_valid, error_msg = validate_front_matter(new_front_matter)
+    if not is_valid:
+        if not silent:
+            print(f"   ⚠️  Warning: Not writing invalid file {post_file.name}: {error_msg}")
+        return False
+    
+    if not silent:
+        print(f"   ✅ Applying corrections to: {post_file.name}{match_note}")
+    new_content = new_front_matter + body
+    
+    # Write the corrected file
+    try:
+        write_post(post_file, new_content)
+        return True
+    except Exception as e:
+        if not silent:
+            print(f"❌ Error writing {post_file.name}: {e}")
+        return False
+
+def _apply_task(task, silent=False):
+    """ProcessPoolExecutor entry point - unpacks one (post_file, correction, match_note) task"""
+    post_file, correction, match_note = task
+    return apply_correction_to_post(post_file, correction, match_note, silent)
 
-def apply_corrections_to_posts(silent=False):
-    """Apply corrections to existing posts"""
+def apply_corrections_to_posts(silent=False, parallel=True):
+    """Apply corrections to existing posts
+    
+    With parallel=False the matched posts are applied one after another in
+    this thread. Callers running inside a multi-threaded process (the
+    corrections API) use it, since forking a process pool from there can
+    deadlock the children.
+    """
     corrections = load_corrections_from_db()
     if not corrections:
         if not silent:
@@ -187,6 +166,9 @@ def apply_corrections_to_posts(silent=False):
     if not silent:
         print(f"📝 Found {len(corrections)} corrections to apply")
     
+    # Timestamp -> correction key, for posts whose filename isn't a key itself
+    by_timestamp = index_corrections_by_timestamp(corrections)
+    
     post_files = get_post_files()
     if not post_files:
         if not silent:
@@ -196,91 +178,25 @@ def apply_corrections_to_posts(silent=False):
     if not silent:
         print(f"📁 Found {len(post_files)} post files")
     
-    applied_count = 0
-    
+    # Matching only needs the filename, so resolve it up front - posts without
+    # corrections are never opened, and each worker gets just its own correction
+    tasks = []
     for post_file in post_files:
-        # Read the file
-        try:
-            with open(post_file, 'r', encoding='utf-8') as f:
-                content = f.read()
-        except Exception as e:
-            if not silent:
-                print(f"❌ Error reading {post_file.name}: {e}")
-            continue
-        
-        # Parse front matter
-        front_matter, body = parse_front_matter(content)
-        
-        # Generate post key from URL-like structure
-        # Convert filename to URL format for matching
-        filename_stem = post_file.stem
-        post_key = f"coffee/{filename_stem}"
-        
-        # Check if this post has corrections
-        if post_key in corrections:
-            if not silent:
-                print(f"   ✅ Applying corrections to: {post_file.name}")
-            
-            # Apply corrections to front matter
-            correction = corrections[post_key]
-            for key, value in correction.items():
-                if value is not None:  # Only apply non-null values
-                    # Convert SQLite boolean integers back to proper booleans for Jekyll
-                    if key == 'published':
-                        front_matter[key] = bool(value)
-                    else:
-                        front_matter[key] = value
-            
-            # Regenerate the file with corrections
-            new_front_matter = generate_front_matter(front_matter)
-            new_content = new_front_matter + body
-            
-            # Write the corrected file
-            try:
-                with open(post_file, 'w', encoding='utf-8') as f:
-                    f.write(new_content)
-                    
-                # Validate the written file
-                is_valid, error_msg = validate_yaml_content(post_file)
-                if not is_valid and not silent:
-                    print(f"   ⚠️  Warning: Created invalid file {post_file.name}: {error_msg}")
-                
-                applied_count += 1
-            except Exception as e:
-                if not silent:
-                    print(f"❌ Error writing {post_file.name}: {e}")
-        else:
-            # Try alternative matching strategies
-            
-            # Method 1: Try matching by timestamp in filename
-            timestamp_match = re.search(r'-(\d{10})\.md$', str(post_file))
-            if timestamp_match:
-                timestamp = timestamp_match.group(1)
-                for correction_key in corrections.keys():
-                    if timestamp in correction_key:
-                        if not silent:
-                            print(f"   ✅ Applying corrections to: {post_file.name} (timestamp match)")
-                        correction = corrections[correction_key]
-                        for key, value in correction.items():
-                            if value is not None:  # Only apply non-null values
-                                # Convert SQLite boolean integers back to proper booleans for Jekyll
-                                if key == 'published':
-                                    front_matter[key] = bool(value)
-                                else:
-                                    front_matter[key] = value
-                        
-                        new_front_matter = generate_front_matter(front_matter)
-                        new_content = new_front_matter + body
-                        
-                        try:
-                            with open(post_file, 'w', encoding='utf-8') as f:
-                                f.write(new_content)
-                            
-                            applied_count += 1
-                        except Exception as e:
-                            if not silent:
-                                print(f"❌ Error writing {post_file.name}: {e}")
-                        break
+        correction_key = find_correction_key(post_file, corrections, by_timestamp)
+        if correction_key:
+            match_note = '' if correction_key == f"coffee/{post_file.stem}" else ' (timestamp match)'
+            tasks.append((post_file, corrections[correction_key], match_note))
+    
+    applied_count = 0
+    apply_one = functools.partial(_apply_task, silent=silent)
+    if not parallel:
+        applied_count = sum(map(apply_one, tasks))
+    elif tasks:
+        # Read/parse/regenerate is CPU-bound and independent per post, so spread
+        # it across processes rather than threads to get past the GIL
+        max_workers = min(len(tasks), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            applied_count = sum(executor.map(apply_one, tasks, chunksize=32))
     
     if not silent:
         print(f"\n✅ Applied corrections to {applied_count} posts")
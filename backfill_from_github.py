@@ -4,11 +4,33 @@ Backfill database with metadata from GitHub repository posts
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor
 import re
 import json
+import tarfile
+import asyncio
+import yaml
+from collections import defaultdict
 from datetime import datetime
 from coffee_db import CoffeeDatabase
 
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+# httpx with h2 lets the per-file fallback multiplex every fetch over one
+# HTTP/2 connection; without it the pooled requests session is used
+try:
+    import httpx
+    import h2  # noqa: F401 - required for httpx's http2=True
+except ImportError:
+    httpx = None
+
+# Number of post files fetched from GitHub in parallel
+FETCH_WORKERS = 16
+
 class GitHubBackfiller:
     def __init__(self):
         self.db = CoffeeDatabase()
@@ -16,15 +38,81 @@ class GitHubBackfiller:
         self.skipped_count = 0
         self.error_count = 0
         
+        # (update_data, post_id) pairs written together by flush_updates
+        self.pending_updates = []
+        
+        # Shared session so concurrent fetches reuse pooled keep-alive connections
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=FETCH_WORKERS, pool_maxsize=FETCH_WORKERS)
+        self.session.mount('https://', adapter)
+        
         # GitHub raw content base URL
         self.base_url = "https://raw.githubusercontent.com/joegaudet-atreides/worldcoffeetour/main/_coffee_posts/"
         
+        # Whole-repository tarball, so every post arrives in a single download
+        self.tarball_url = "https://api.github.com/repos/joegaudet-atreides/worldcoffeetour/tarball/main"
+        
+    def fetch_posts_from_tarball(self):
+        """Download the repository tarball once and extract every post
+        
+        Returns a list of (filename, content) pairs, or None if the download failed.
+        """
+        posts = []
+        
+        try:
+            with self.session.get(self.tarball_url, stream=True) as response:
+                response.raise_for_status()
+                with tarfile.open(fileobj=response.raw, mode='r|gz') as archive:
+                    for member in archive:
+                        # Entries look like <owner>-<repo>-<sha>/_coffee_posts/<file>.md
+                        parent, _, filename = member.name.rpartition('/')
+                        if member.isfile() and parent.endswith('/_coffee_posts') and filename.endswith('.md'):
+                            content = archive.extractfile(member).read().decode('utf-8')
+                            posts.append((filename, content))
+        except Exception as e:
+            print(f"❌ Error downloading repository tarball: {e}")
+            return None
+        
+        posts.sort()
+        print(f"📁 Found {len(posts)} posts on GitHub")
+        return posts
+    
+    def fetch_posts_individually(self):
+        """Fetch posts one file at a time via the contents API and raw URLs"""
+        github_files = self.get_github_post_list()
+        
+        # Fetching is latency-bound, so pull all files concurrently up front
+        if httpx is not None:
+            contents = asyncio.run(self.fetch_posts_http2(github_files))
+        else:
+            with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+                contents = list(executor.map(self.fetch_post_content, github_files))
+        
+        return list(zip(github_files, contents))
+    
+    async def fetch_posts_http2(self, github_files):
+        """Fetch all posts as concurrent streams on a single HTTP/2 connection"""
+        limits = httpx.Limits(max_connections=1, max_keepalive_connections=1)
+        timeout = httpx.Timeout(30.0, pool=None)
+        
+        async with httpx.AsyncClient(http2=True, limits=limits, timeout=timeout) as client:
+            async def fetch(filename):
+                try:
+                    response = await client.get(self.base_url + filename)
+                    response.raise_for_status()
+                    return response.text
+                except Exception as e:
+                    print(f"❌ Error fetching {filename}: {e}")
+                    return None
+            
+            return await asyncio.gather(*(fetch(filename) for filename in github_files))
+    
     def get_github_post_list(self):
         """Get list of all posts from GitHub API"""
         api_url = "https://api.github.com/repos/joegaudet-atreides/worldcoffeetour/contents/_coffee_posts"
         
         try:
-            response = requests.get(api_url)
+            response = self.session.get(api_url)
             response.raise_for_status()
             files = response.json()
             
@@ -42,7 +130,7 @@ class GitHubBackfiller:
         url = self.base_url + filename
         
         try:
-            response = requests.get(url)
+            response = self.session.get(url)
             response.raise_for_status()
             return response.text
         except Exception as e:
@@ -54,73 +142,97 @@ class GitHubBackfiller:
         if not content.startswith('---'):
             return None
             
-        # Split content into frontmatter and body
-        parts = content.split('---', 2)
-        if len(parts) < 2:
+        # Front matter runs up to the next --- line (or the end of the file)
+        end_pos = content.find('\n---', 3)
+        frontmatter_text = content[3:end_pos] if end_pos != -1 else content[3:]
+        
+        try:
+            parsed = yaml.load(frontmatter_text, Loader=SafeLoader)
+        except yaml.YAMLError:
+            # Older posts have unquoted values like '% Arabica' or '@handle'
+            # that aren't valid YAML, so read those line by line instead
+            parsed = self.parse_frontmatter_lines(frontmatter_text)
+        if not isinstance(parsed, dict):
             return None
-            
-        frontmatter_text = parts[1].strip()
         
-        # Simple YAML-like parsing for our specific format
         data = {}
         
+        for key, value in parsed.items():
+            # Handle special cases
+            if key == 'latitude' or key == 'longitude':
+                try:
+                    data[key] = float(value) if value not in (None, '') else None
+                except (TypeError, ValueError):
+                    data[key] = None
+            elif key == 'published':
+                data[key] = value is True or str(value).lower() in ('1', 'true')
+            elif key == 'images':
+                # Skip images parsing for now - we have better images from import
+                continue
+            else:
+                # Keep everything else as text (dates included) to match DB columns
+                data[key] = str(value) if value not in (None, '') else None
+        
+        return data
+    
+    def parse_frontmatter_lines(self, frontmatter_text):
+        """Read simple 'key: value' lines from front matter that isn't valid YAML"""
+        parsed = {}
+        
         for line in frontmatter_text.split('\n'):
             line = line.strip()
-            if not line or line.startswith('#'):
+            # Skip comments and list items (images)
+            if not line or line.startswith(('#', '-')) or ':' not in line:
                 continue
-                
-            if ':' in line:
-                key, value = line.split(':', 1)
-                key = key.strip()
-                value = value.strip()
-                
-                # Remove quotes
-                if value.startswith('"') and value.endswith('"'):
-                    value = value[1:-1]
-                elif value.startswith("'") and value.endswith("'"):
-                    value = value[1:-1]
-                
-                # Handle special cases
-                if key == 'latitude' or key == 'longitude':
-                    try:
-                        data[key] = float(value) if value else None
-                    except:
-                        data[key] = None
-                elif key == 'published':
-                    data[key] = value == '1' or value.lower() == 'true'
-                elif key == 'images':
-                    # Skip images parsing for now - we have better images from import
-                    continue  
-                else:
-                    data[key] = value if value else None
+            
+            key, value = line.split(':', 1)
+            value = value.strip()
+            
+            # Remove quotes
+            if len(value) >= 2 and value[0] == value[-1] and value[0] in '"\'':
+                value = value[1:-1]
+            
+            parsed[key.strip()] = value
         
-        return data
+        return parsed
     
-    def find_matching_db_post(self, github_data):
+    def index_db_posts(self):
+        """Load database posts once and index them for matching
+        
+        Returns (posts, by_date, title_tokens): posts grouped by date, and the
+        set of lowercased title words for each post id.
+        """
+        # Matching and updates only touch plain columns, so skip the JSON decoding
+        posts = self.db.get_all_posts(parse_json=False)
+        by_date = defaultdict(list)
+        title_tokens = {}
+        
+        for post in posts:
+            by_date[post.get('date')].append(post)
+            title_tokens[post['id']] = set((post.get('title') or '').lower().split())
+        
+        return posts, by_date, title_tokens
+    
+    def find_matching_db_post(self, github_data, posts, by_date, title_tokens):
         """Find matching post in database"""
         title = github_data.get('title', '')
         date = github_data.get('date', '')
         
         if not title or not date:
             return None
-            
-        # Get posts from database and try to match
-        posts = self.db.get_all_posts()
         
-        for post in posts:
-            # Try exact date match first
-            if post.get('date') == date:
-                # Check title similarity
-                db_title = post.get('title', '').lower()
-                gh_title = title.lower()
-                
-                # Simple fuzzy matching - check if key words match
-                if any(word in db_title for word in gh_title.split()[:3]):
-                    return post
-            
-            # Also try matching by cafe name if available
-            if github_data.get('cafe_name'):
-                if github_data['cafe_name'].lower() in post.get('title', '').lower():
+        # Try exact date match first, then check title similarity -
+        # simple fuzzy matching on whether key words match
+        key_words = set(title.lower().split()[:3])
+        for post in by_date.get(date, ()):
+            if key_words & title_tokens[post['id']]:
+                return post
+        
+        # Also try matching by cafe name if available
+        if github_data.get('cafe_name'):
+            cafe_name = github_data['cafe_name'].lower()
+            for post in posts:
+                if cafe_name in (post.get('title') or '').lower():
                     return post
                     
         return None
@@ -148,37 +260,64 @@ class GitHubBackfiller:
             if new_value and (not existing_value or existing_value in ['Unknown', '', None, 'unknown']):
                 update_data[db_field] = new_value
         
-        # Update the post if we have new data
+        # Queue the update if we have new data; flush_updates writes them all at once
         if update_data:
-            try:
-                self.db.update_post(db_post['id'], update_data)
-                print(f"  ✅ Updated: {update_data}")
-                return True
-            except Exception as e:
-                print(f"  ❌ Error updating: {e}")
-                return False
+            self.pending_updates.append((update_data, db_post['id']))
+            # Keep the cached copy current for later GitHub posts that match it
+            db_post.update(update_data)
+            print(f"  ✅ Updated: {update_data}")
+            return True
         else:
             print(f"  ⏭️  No updates needed")
             return False
     
+    def flush_updates(self):
+        """Write all queued updates in a single transaction"""
+        if not self.pending_updates:
+            return True
+        
+        # One executemany per distinct set of updated columns
+        groups = defaultdict(list)
+        for update_data, post_id in self.pending_updates:
+            fields = tuple(update_data)
+            groups[fields].append([update_data[field] for field in fields] + [post_id])
+        
+        try:
+            with self.db.conn:
+                for fields, rows in groups.items():
+                    set_clause = ', '.join(f'{field} = ?' for field in fields)
+                    self.db.conn.executemany(
+                        f"UPDATE posts SET {set_clause}, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                        rows
+                    )
+        except Exception as e:
+            print(f"❌ Error writing updates: {e}")
+            return False
+        
+        self.pending_updates = []
+        return True
+    
     def backfill_all(self):
         """Backfill all posts from GitHub"""
         print("🔄 Starting GitHub backfill process...")
         
-        # Get list of posts from GitHub
-        github_files = self.get_github_post_list()
+        # Get all posts from GitHub in one download, falling back to per-file fetches
+        github_posts = self.fetch_posts_from_tarball()
+        if github_posts is None:
+            github_posts = self.fetch_posts_individually()
         
-        if not github_files:
+        if not github_posts:
             print("❌ No posts found on GitHub")
             return
         
-        print(f"📥 Processing {len(github_files)} posts...")
+        print(f"📥 Processing {len(github_posts)} posts...")
+        
+        # Load and index database posts once rather than per GitHub post
+        db_posts, by_date, title_tokens = self.index_db_posts()
         
-        for i, filename in enumerate(github_files, 1):
-            print(f"\n[{i}/{len(github_files)}] Processing: {filename}")
+        for i, (filename, content) in enumerate(github_posts, 1):
+            print(f"\n[{i}/{len(github_posts)}] Processing: {filename}")
             
-            # Fetch post content
-            content = self.fetch_post_content(filename)
             if not content:
                 self.error_count += 1
                 continue
@@ -193,7 +332,7 @@ class GitHubBackfiller:
             print(f"  📍 GitHub: {github_data.get('cafe_name', 'Unknown')} in {github_data.get('city', 'Unknown')}")
             
             # Find matching post in database
-            db_post = self.find_matching_db_post(github_data)
+            db_post = self.find_matching_db_post(github_data, db_posts, by_date, title_tokens)
             if not db_post:
                 print(f"  ❓ No matching post found in database")
                 self.skipped_count += 1
@@ -207,6 +346,11 @@ class GitHubBackfiller:
             else:
                 self.skipped_count += 1
         
+        # Write every queued update in one transaction
+        if not self.flush_updates():
+            self.error_count += self.updated_count
+            self.updated_count = 0
+        
         # Print summary
         print(f"\n📊 Backfill Summary:")
         print(f"  ✅ Updated: {self.updated_count} posts")
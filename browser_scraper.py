@@ -4,12 +4,174 @@ Browser-based Instagram Scraper using Selenium
 Most reliable method for scraping Instagram posts
 """
 
+import os
 import json
 import re
 import time
+import asyncio
+import atexit
+import multiprocessing
+import urllib.request
+from html import unescape
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.util import Finalize
 from datetime import datetime
 from pathlib import Path
 
+# Post pages are fetched over plain HTTP/2 when httpx (with h2) is installed;
+# a browser is only needed for pages that come back behind the login wall
+try:
+    import httpx
+    import h2  # noqa: F401 - required for httpx's http2=True
+except ImportError:
+    httpx = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# lxml parses a post page once for every meta tag; without it a single
+# regex pass over the page picks them up instead
+try:
+    import lxml.html
+except ImportError:
+    lxml = None
+
+USER_AGENT = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+
+# Number of browser processes that fetch individual posts in parallel
+SCRAPE_WORKERS = 4
+
+# Number of post pages fetched over HTTP at once
+FETCH_CONCURRENCY = 10
+
+# Number of threads fetching post pages when httpx isn't installed
+URLLIB_FETCH_WORKERS = 20
+
+# Number of threads writing Jekyll post files
+WRITE_WORKERS = 8
+
+# Media the browser never downloads - post data comes from the page's
+# meta tags and shared data, so images, video and fonts are dead weight
+_BLOCKED_URLS = ['*.jpg', '*.jpeg', '*.png', '*.webp', '*.gif', '*.mp4', '*.woff*']
+
+_SHORTCODE_RE = re.compile(r'/p/([A-Za-z0-9_-]+)/')
+_SHARED_DATA_RE = re.compile(r'window\._sharedData\s*=\s*({.+?});')
+_OG_META_RE = re.compile(r'<meta property="(og:[a-z]+)" content="([^"]*)"')
+# Hashtags, mentions and runs of blank lines, cleaned from a caption in one pass
+_CAPTION_CLEANUP_RE = re.compile(r'[#@]\w+\s*|\n{2,}')
+_NONWORD_RE = re.compile(r'[^\w\s-]')
+_DASH_RE = re.compile(r'[-\s]+')
+
+# Each pool worker owns its own scraper and browser - Selenium drivers
+# can't be shared between threads or processes
+_worker_scraper = None
+
+def _init_worker(headless):
+    """Pool initializer: start this worker's browser and quit it when the worker exits"""
+    global _worker_scraper
+    _worker_scraper = BrowserInstagramScraper()
+    if _worker_scraper.setup_browser(headless=headless):
+        Finalize(None, _worker_scraper.close, exitpriority=10)
+
+async def _fetch_post_html(client, semaphore, url):
+    """Fetch one post page, or None if the request failed"""
+    async with semaphore:
+        try:
+            response = await client.get(url)
+            response.raise_for_status()
+            return response.text
+        except Exception as e:
+            print(f"Error fetching post {url}: {e}")
+            return None
+
+async def _gather_posts(post_links):
+    """Fetch every post page concurrently over one HTTP/2 client"""
+    semaphore = asyncio.Semaphore(FETCH_CONCURRENCY)
+    async with httpx.AsyncClient(http2=True, headers={'User-Agent': USER_AGENT},
+                                 follow_redirects=True, timeout=30) as client:
+        return await asyncio.gather(*(_fetch_post_html(client, semaphore, url) for url in post_links))
+
+def _parse_page(html):
+    """Return (shared_data_match, og_meta) for a post page in one pass over the HTML
+    
+    og_meta maps each og: property to the content of its first meta tag.
+    """
+    # Most pages no longer embed _sharedData; a substring check rules that
+    # out without running the non-greedy regex (or the XPath) over the page
+    has_shared_data = '_sharedData' in html
+    
+    if lxml is not None:
+        doc = lxml.html.fromstring(html)
+        og_meta = {}
+        for meta in doc.iterfind('.//meta[@property]'):
+            og_meta.setdefault(meta.get('property'), meta.get('content') or '')
+        scripts = doc.xpath('//script[contains(text(), "_sharedData")]/text()') if has_shared_data else None
+        return (_SHARED_DATA_RE.search(scripts[0]) if scripts else None), og_meta
+    
+    # Decode entities such as &amp; in image URLs, as lxml does
+    og_meta = {}
+    for match in _OG_META_RE.finditer(html):
+        og_meta.setdefault(match.group(1), unescape(match.group(2)))
+    return (_SHARED_DATA_RE.search(html) if has_shared_data else None), og_meta
+
+def _fetch_post_html_urllib(url):
+    """Fetch one post page with urllib, or None if the request failed"""
+    try:
+        req = urllib.request.Request(url, headers={'User-Agent': USER_AGENT})
+        with urllib.request.urlopen(req, timeout=5) as response:
+            return response.read().decode('utf-8', errors='replace')
+    except Exception as e:
+        print(f"Error fetching post {url}: {e}")
+        return None
+
+def _fetch_post_pages(post_links):
+    """Fetch every post page concurrently - HTTP/2 via httpx if available, else urllib threads"""
+    if httpx is not None:
+        return asyncio.run(_gather_posts(post_links))
+    with ThreadPoolExecutor(max_workers=URLLIB_FETCH_WORKERS) as executor:
+        return list(executor.map(_fetch_post_html_urllib, post_links))
+
+def _clean_notes(caption):
+    """Caption with hashtags and mentions removed and blank lines collapsed"""
+    return _CAPTION_CLEANUP_RE.sub(lambda m: '\n' if m.group().startswith('\n') else '', caption).strip()
+
+def _write_post(task):
+    """Write one post file atomically; returns True if it was written
+    
+    The content goes to a sibling temp file that is renamed over the post, so
+    a crash never leaves a truncated post behind.
+    """
+    filepath, content = task
+    tmp_file = filepath.with_suffix('.md.tmp')
+    try:
+        tmp_file.write_bytes(content.encode('utf-8'))
+        os.replace(tmp_file, filepath)
+        return True
+    except Exception as e:
+        tmp_file.unlink(missing_ok=True)
+        print(f"Error writing {filepath}: {e}")
+        return False
+
+def _scrape_one(task):
+    """Scrape one post in a pool worker
+    
+    Returns (index, post_data, scraped): post_data is set for coffee posts
+    only, and scraped is False if this worker's browser never started.
+    """
+    index, link = task
+    if not _worker_scraper.driver:
+        return index, None, False
+    
+    post_data = _worker_scraper.scrape_single_post(link)
+    time.sleep(2)  # Rate limiting, per worker
+    
+    # Filter here so non-coffee posts never travel back to the parent
+    if post_data and '#worldcoffeetour' in post_data.get('caption', '').lower():
+        return index, post_data, True
+    return index, None, True
+
 def install_selenium():
     """Install selenium and webdriver if not available"""
     try:
@@ -33,9 +195,20 @@ def install_selenium():
 class BrowserInstagramScraper:
     def __init__(self):
         self.driver = None
+        self.headless = True
+        # Browser worker pool, kept alive across scrapes until close()
+        self.pool = None
+        # close() is registered to run at exit once, on the first browser start
+        self._atexit_registered = False
     
     def setup_browser(self, headless=True):
-        """Setup Chrome browser with options"""
+        """Setup Chrome browser with options, reusing a running browser if there is one"""
+        if self.driver and self.driver.session_id and headless == self.headless:
+            self.reset_session()
+            return True
+        
+        self.close()
+        self.headless = headless
         try:
             from selenium import webdriver
             from selenium.webdriver.chrome.options import Options
@@ -47,9 +220,15 @@ class BrowserInstagramScraper:
             options.add_argument('--disable-dev-shm-usage')
             options.add_argument('--disable-gpu')
             options.add_argument('--window-size=1920,1080')
-            options.add_argument('--user-agent=Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36')
+            options.add_argument(f'--user-agent={USER_AGENT}')
+            options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
             
             self.driver = webdriver.Chrome(options=options)
+            self.driver.execute_cdp_cmd('Network.enable', {})
+            self.driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': _BLOCKED_URLS})
+            if not self._atexit_registered:
+                atexit.register(self.close)
+                self._atexit_registered = True
             return True
             
         except Exception as e:
@@ -69,8 +248,8 @@ class BrowserInstagramScraper:
             print(f"🔍 Loading @{username} profile...")
             self.driver.get(f"https://www.instagram.com/{username}/")
             
-            # Wait for page to load
-            time.sleep(3)
+            # Wait for the post grid to render
+            self.wait_for_element("article", timeout=10)
             
             # Scroll down to load more posts
             print("📜 Scrolling to load posts...")
@@ -80,54 +259,151 @@ class BrowserInstagramScraper:
             post_links = self.extract_post_links()
             print(f"🔗 Found {len(post_links)} posts")
             
-            # Filter and scrape coffee posts
-            coffee_posts = []
-            for i, link in enumerate(post_links, 1):
-                print(f"📝 Processing post {i}/{len(post_links)}...")
-                post_data = self.scrape_single_post(link)
-                
-                if post_data and '#worldcoffeetour' in post_data.get('caption', '').lower():
-                    coffee_posts.append(post_data)
-                    print(f"  ✅ Coffee post: {post_data['title']}")
-                else:
-                    print(f"  ⏭️  Not a coffee tour post")
-                
-                time.sleep(2)  # Rate limiting
-            
-            return coffee_posts
+            # Filter and scrape coffee posts - over HTTP where possible, then
+            # through a pool of browsers for anything that needs one
+            found = []
+            browser_tasks = self.scrape_posts_over_http(post_links, found)
+            if browser_tasks:
+                self.scrape_posts_with_browsers(browser_tasks, found)
+            
+            # Results arrive out of order; keep the profile's ordering
+            found.sort(key=lambda item: item[0])
+            return [post_data for _, post_data in found]
             
         except Exception as e:
             print(f"❌ Error scraping profile: {e}")
             return []
     
+    def scrape_posts_over_http(self, post_links, found):
+        """Fetch post pages without a browser and read their og: meta tags
+        
+        Coffee posts are appended to found as (index, post_data); returns the
+        (index, link) tasks that still need a browser.
+        """
+        print(f"🌐 Fetching {len(post_links)} posts over HTTP...")
+        pages = _fetch_post_pages(post_links)
+        
+        browser_tasks = []
+        for index, (link, html) in enumerate(zip(post_links, pages)):
+            # Failed fetches and the login wall fall back to the browser
+            if html is None or 'loginForm' in html:
+                browser_tasks.append((index, link))
+                continue
+            
+            shortcode_match = _SHORTCODE_RE.search(link)
+            post_data = self.extract_post_data_from_html(html, shortcode_match.group(1) if shortcode_match else "")
+            if not post_data or not post_data.get('caption'):
+                # Without a caption we can still rule the post out cheaply - an
+                # unwalled page that never mentions the tag isn't worth a browser
+                if 'worldcoffeetour' in html.lower():
+                    browser_tasks.append((index, link))
+                continue
+            
+            post_data['instagram_url'] = link
+            if '#worldcoffeetour' in post_data['caption'].lower():
+                found.append((index, post_data))
+                print(f"  ✅ Coffee post: {post_data['title']}")
+        
+        if browser_tasks:
+            print(f"🔒 {len(browser_tasks)} posts need a browser")
+        return browser_tasks
+    
+    def scrape_posts_with_browsers(self, tasks, found):
+        """Scrape (index, link) tasks across a pool of browser processes, appending coffee posts to found"""
+        # The pool's browsers stay up between scrapes and are shut down by close()
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(SCRAPE_WORKERS, initializer=_init_worker, initargs=(self.headless,))
+        
+        results = self.pool.imap_unordered(_scrape_one, tasks, chunksize=2)
+        links = dict(tasks)
+        failed = []
+        for i, (index, post_data, scraped) in enumerate(results, 1):
+            print(f"📝 Processed post {i}/{len(tasks)}...")
+            if not scraped:
+                failed.append((index, links[index]))
+                print("  ⚠️  Worker browser unavailable, will retry")
+            elif post_data:
+                found.append((index, post_data))
+                print(f"  ✅ Coffee post: {post_data['title']}")
+            else:
+                print(f"  ⏭️  Not a coffee tour post")
+        
+        # Links handed to a worker whose browser failed to start are retried
+        # in this process's own browser
+        if failed:
+            print(f"🔁 Retrying {len(failed)} posts in the main browser...")
+        for index, link in failed:
+            if not self.driver:
+                print(f"  ❌ Failed to scrape {link}: no browser available")
+                continue
+            post_data = self.scrape_single_post(link)
+            time.sleep(2)  # Rate limiting
+            if post_data and '#worldcoffeetour' in post_data.get('caption', '').lower():
+                found.append((index, post_data))
+                print(f"  ✅ Coffee post: {post_data['title']}")
+    
     def scroll_and_load_posts(self):
         """Scroll down to load more posts"""
         last_height = self.driver.execute_script("return document.body.scrollHeight")
         
         for _ in range(5):  # Scroll 5 times to load more posts
             self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-            time.sleep(2)
             
-            new_height = self.driver.execute_script("return document.body.scrollHeight")
-            if new_height == last_height:
+            # Stop as soon as the page grows; if it doesn't within the timeout
+            # there is nothing more to load
+            if not self.wait_until(
+                lambda driver: driver.execute_script("return document.body.scrollHeight") != last_height,
+                timeout=3,
+            ):
                 break
-            last_height = new_height
+            last_height = self.driver.execute_script("return document.body.scrollHeight")
+    
+    def wait_until(self, condition, timeout):
+        """Poll condition(driver) every 250ms; returns False if it never held within timeout"""
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.common.exceptions import TimeoutException
+        
+        try:
+            WebDriverWait(self.driver, timeout, poll_frequency=0.25).until(condition)
+            return True
+        except TimeoutException:
+            return False
+    
+    def wait_for_element(self, css_selector, timeout):
+        """Wait for an element matching css_selector to appear in the page"""
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        
+        return self.wait_until(EC.presence_of_element_located((By.CSS_SELECTOR, css_selector)), timeout)
     
     def extract_post_links(self):
-        """Extract all post links from profile"""
+        """Extract coffee post links from profile
+        
+        The grid thumbnails carry a caption preview as alt text, so posts
+        whose preview doesn't mention the tour are dropped before any page
+        is fetched. Thumbnails without alt text are kept to be checked later.
+        """
         try:
             from selenium.webdriver.common.by import By
             
-            # Find post links
+            # Find post links, with the alt text of each one's thumbnail
             links = self.driver.find_elements(By.CSS_SELECTOR, "a[href*='/p/']")
-            post_urls = []
+            post_alts = {}
             
             for link in links:
                 href = link.get_attribute('href')
-                if '/p/' in href and href not in post_urls:
-                    post_urls.append(href)
+                if '/p/' in href and href not in post_alts:
+                    images = link.find_elements(By.TAG_NAME, 'img')
+                    post_alts[href] = (images[0].get_attribute('alt') or '') if images else ''
+                    if len(post_alts) == 50:  # Limit to first 50 posts
+                        break
             
-            return post_urls[:50]  # Limit to first 50 posts
+            post_urls = [href for href, alt in post_alts.items()
+                         if not alt or 'worldcoffeetour' in alt.lower()]
+            skipped = len(post_alts) - len(post_urls)
+            if skipped:
+                print(f"⏭️  Skipped {skipped} posts whose previews aren't coffee posts")
+            return post_urls
             
         except Exception as e:
             print(f"Error extracting links: {e}")
@@ -137,13 +413,13 @@ class BrowserInstagramScraper:
         """Scrape data from a single post"""
         try:
             self.driver.get(post_url)
-            time.sleep(2)
+            self.wait_for_element("meta[property='og:title']", timeout=8)
             
             # Extract post data from page source
             page_source = self.driver.page_source
             
             # Extract shortcode from URL
-            shortcode_match = re.search(r'/p/([A-Za-z0-9_-]+)/', post_url)
+            shortcode_match = _SHORTCODE_RE.search(post_url)
             shortcode = shortcode_match.group(1) if shortcode_match else ""
             
             # Extract data using various methods
@@ -161,26 +437,25 @@ class BrowserInstagramScraper:
     def extract_post_data_from_html(self, html, shortcode):
         """Extract post data from HTML"""
         try:
+            json_match, og_meta = _parse_page(html)
+            
             # Method 1: Look for JSON data in script tags
-            json_match = re.search(r'window\._sharedData\s*=\s*({.+?});', html)
             if json_match:
-                data = json.loads(json_match.group(1))
+                raw = json_match.group(1)
+                data = orjson.loads(raw) if orjson is not None else json.loads(raw)
                 post_data = self.parse_json_data(data)
                 if post_data:
                     return post_data
             
             # Method 2: Extract from meta tags and visible elements
             # Caption from meta description
-            caption_match = re.search(r'<meta property="og:description" content="([^"]*)"', html)
-            caption = caption_match.group(1) if caption_match else ""
+            caption = og_meta.get('og:description', "")
             
             # Image from meta
-            image_match = re.search(r'<meta property="og:image" content="([^"]*)"', html)
-            image_url = image_match.group(1) if image_match else ""
+            image_url = og_meta.get('og:image', "")
             
             # Title from meta
-            title_match = re.search(r'<meta property="og:title" content="([^"]*)"', html)
-            title = title_match.group(1) if title_match else ""
+            title = og_meta.get('og:title', "")
             
             # Clean up title
             if title.startswith('"') and title.endswith('"'):
@@ -196,9 +471,7 @@ class BrowserInstagramScraper:
                     title = "Coffee Stop"
             
             # Clean notes
-            notes = re.sub(r'#\w+\s*', '', caption).strip()
-            notes = re.sub(r'@\w+\s*', '', notes).strip()
-            notes = re.sub(r'\n\n+', '\n', notes).strip()
+            notes = _clean_notes(caption)
             
             return {
                 'shortcode': shortcode,
@@ -259,8 +532,7 @@ class BrowserInstagramScraper:
                 title = "Coffee Stop"
             
             # Clean notes
-            notes = re.sub(r'#\w+\s*', '', caption).strip()
-            notes = re.sub(r'@\w+\s*', '', notes).strip()
+            notes = _clean_notes(caption)
             
             return {
                 'shortcode': shortcode,
@@ -276,10 +548,21 @@ class BrowserInstagramScraper:
             print(f"Error parsing JSON: {e}")
             return None
     
+    def reset_session(self):
+        """Clear cookies and cache so a reused browser starts a fresh session"""
+        self.driver.delete_all_cookies()
+        self.driver.execute_cdp_cmd('Network.clearBrowserCache', {})
+    
     def close(self):
-        """Close browser"""
+        """Close browser and any worker browsers"""
+        if self.pool is not None:
+            # close/join rather than terminate so each worker quits its browser
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
         if self.driver:
             self.driver.quit()
+            self.driver = None
     
     def save_posts_to_jekyll(self, posts):
         """Save posts as Jekyll files"""
@@ -297,13 +580,14 @@ class BrowserInstagramScraper:
             posts_dir = Path("_coffee_posts")
             posts_dir.mkdir(exist_ok=True)
             
-            count = 0
+            # Build every file first, then write them all in parallel
+            files = []
             for post in posts:
                 try:
                     date_str = post['date'][:10]
                     title = post['title']
-                    slug = re.sub(r'[^\w\s-]', '', title.lower())
-                    slug = re.sub(r'[-\s]+', '-', slug)[:30]
+                    slug = _NONWORD_RE.sub('', title.lower())
+                    slug = _DASH_RE.sub('-', slug)[:30]
                     
                     filename = f"{date_str}-{slug}.md"
                     filepath = posts_dir / filename
@@ -329,13 +613,13 @@ image_url: "{post['image_url']}"
 instagram_url: "{post['instagram_url']}"
 ---"""
                     
-                    filepath.write_text(post_content)
-                    count += 1
+                    files.append((filepath, post_content))
                     
                 except Exception as e:
                     print(f"Error creating post: {e}")
             
-            return count
+            with ThreadPoolExecutor(max_workers=WRITE_WORKERS) as executor:
+                return sum(executor.map(_write_post, files))
 
 def main():
     print("""
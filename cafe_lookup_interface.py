@@ -6,120 +6,227 @@ Helps identify missing cafe names and locations
 
 import json
 import re
-import urllib.request
-import urllib.parse
-import urllib.error
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import datetime
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple
+import asyncio
+import functools
+import inspect
+import math
+import shelve
 import time
 
-def load_posts():
-    """Load Instagram export posts"""
-    with open('instagram-export-folder/your_instagram_activity/media/posts_1.json', 'r', encoding='utf-8') as f:
-        posts = json.load(f)
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# ijson streams the Instagram export so only coffee posts are ever kept in memory
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# google-re2 matches the caption patterns without backtracking when installed
+try:
+    import re2 as _location_re
+except ImportError:
+    _location_re = re
+
+CACHE_TTL_DAYS = 30
+GEOCODE_CACHE = "geocode_cache"
+OVERPASS_CACHE = "overpass_cache"
+
+# Radius, in metres, searched around each post's coordinates for cafes
+CAFE_SEARCH_RADIUS = 100
+
+# Nominatim's usage policy allows at most one request per second
+NOMINATIM_INTERVAL = 1.0
+
+# Country -> continent, keyed by upper-cased country name so lookups ignore case
+CONTINENT_MAP = {country.upper(): continent for country, continent in {
+    'Canada': 'North America',
+    'United States': 'North America',
+    'United States of America': 'North America',
+    'Mexico': 'North America',
+    'Chile': 'South America',
+    'Argentina': 'South America',
+    'Brazil': 'South America',
+    'United Kingdom': 'Europe',
+    'France': 'Europe',
+    'Germany': 'Europe',
+    'Italy': 'Europe',
+    'Spain': 'Europe',
+    'Japan': 'Asia',
+    'China': 'Asia',
+    'India': 'Asia',
+    'Australia': 'Oceania',
+    'New Zealand': 'Oceania',
+}.items()}
+
+# One pooled keep-alive session per API, so repeat lookups skip the TCP+TLS handshake
+_NOMINATIM = requests.Session()
+_NOMINATIM.headers['User-Agent'] = 'WorldCoffeeTour/1.0 (https://worldcoffeetour.joegaudet.com)'
+_NOMINATIM.mount('https://', HTTPAdapter(
+    pool_connections=10, pool_maxsize=20,
+    max_retries=Retry(total=2, backoff_factor=1, status_forcelist=(429, 500, 502, 503, 504))
+))
+
+# Overpass queries are POSTs and keep their own retry loop below
+_OVERPASS = requests.Session()
+_OVERPASS.headers['User-Agent'] = 'WorldCoffeeTour/1.0'
+_OVERPASS.mount('https://', HTTPAdapter(pool_connections=10, pool_maxsize=20))
+
+def cache_get(path: str, cache_key: str, ttl_days: int = CACHE_TTL_DAYS):
+    """Return a cached value, or None if it is missing or older than ttl_days"""
+    with shelve.open(path, flag='c') as cache:
+        entry = cache.get(cache_key)
+    if entry is not None and time.time() - entry[0] < ttl_days * 24 * 60 * 60:
+        return entry[1]
+    return None
+
+def cache_put(path: str, entries: Dict[str, object]):
+    """Store values in a shelve cache file as (timestamp, value) pairs"""
+    now = time.time()
+    with shelve.open(path, flag='c') as cache:
+        for cache_key, value in entries.items():
+            cache[cache_key] = (now, value)
+
+def disk_cache(path: str, key, ttl_days: int = CACHE_TTL_DAYS):
+    """Cache a lookup's results on disk in a shelve file
     
-    # Find coffee posts
-    coffee_posts = []
-    coffee_hashtags = [
-        '#worldcoffeetour', '#worldcofeetour', '#world_coffee_tour',
-        '#worldcoffee', '#cofeetour', 'worldcoffeetour', 'world coffee tour'
-    ]
+    key is called with just the lookup's arguments named in its own
+    signature, so settings like retries don't need to be part of it.
+    Entries are re-fetched after ttl_days. None results are not cached,
+    since the lookups also return None on network errors.
+    """
+    key_params = tuple(inspect.signature(key).parameters)
     
-    for post in posts:
-        title = post.get('title', '').lower()
-        if any(hashtag in title for hashtag in coffee_hashtags):
-            coffee_posts.append(post)
+    def decorator(func):
+        signature = inspect.signature(func)
+        
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            cache_key = key(*(bound.arguments[name] for name in key_params))
+            result = cache_get(path, cache_key, ttl_days)
+            if result is not None:
+                return result
+            
+            result = func(*args, **kwargs)
+            if result is not None:
+                cache_put(path, {cache_key: result})
+            return result
+        return wrapper
+    return decorator
+
+def geocode_key(location: str) -> str:
+    """Geocode cache key - the location, case and whitespace insensitive"""
+    return location.strip().lower()
+
+def coordinate_key(latitude: float, longitude: float) -> str:
+    """Overpass cache key - coordinates rounded to about 10m"""
+    return f"{round(latitude, 4)},{round(longitude, 4)}"
+
+def haversine_meters(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in metres"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * 6371000 * math.asin(math.sqrt(a))
+
+# Coffee tour hashtags and spellings ('#worldcoffee' also covers '#worldcoffeetour')
+_COFFEE_TAG_RE = re.compile(r'#world(?:coffee|cofeetour|_coffee_tour)|#cofeetour|worldcoffeetour|world coffee tour')
+
+@functools.lru_cache(maxsize=1)
+def load_posts():
+    """Load Instagram export posts
     
-    return coffee_posts
+    The export is parsed once per session; analyze_posts and
+    interactive_lookup share the cached list, so don't modify it.
+    """
+    with open('instagram-export-folder/your_instagram_activity/media/posts_1.json', 'rb') as f:
+        if ijson is not None:
+            posts = ijson.items(f, 'item', use_float=True)
+        else:
+            raw = f.read()
+            posts = orjson.loads(raw) if orjson is not None else json.loads(raw)
+        
+        # Find coffee posts
+        return [post for post in posts if _COFFEE_TAG_RE.search(post.get('title', '').lower())]
+
+# Common location patterns, in priority order
+_LOCATION_PATTERNS = [
+    _location_re.compile(r'in\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)'),  # "in Vancouver" 
+    _location_re.compile(r'at\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)'),  # "at Whistler"
+    _location_re.compile(r'([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\s+stop'),  # "Vancouver stop"
+    _location_re.compile(r'([A-Z][a-z]+),\s*([A-Z][a-z]+)'),  # "Vancouver, BC"
+]
 
+# Common false positives
+_LOCATION_FALSE_POSITIVES = frozenset({'Coffee', 'Tour', 'Stop', 'Day', 'Good', 'Great', 'Amazing', 'Fantastic'})
+
+@functools.lru_cache(maxsize=512)
 def extract_location_from_caption(caption: str) -> Optional[str]:
-    """Extract likely location mentions from caption"""
-    # Common location patterns
-    location_patterns = [
-        r'in\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)',  # "in Vancouver" 
-        r'at\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)',  # "at Whistler"
-        r'([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\s+stop',  # "Vancouver stop"
-        r'([A-Z][a-z]+),\s*([A-Z][a-z]+)',  # "Vancouver, BC"
-    ]
-    
-    locations = []
-    for pattern in location_patterns:
-        matches = re.findall(pattern, caption)
-        for match in matches:
-            if isinstance(match, tuple):
-                locations.extend(match)
-            else:
-                locations.append(match)
+    """Extract likely location mentions from caption
     
-    # Filter out common false positives
-    false_positives = {'Coffee', 'Tour', 'Stop', 'Day', 'Good', 'Great', 'Amazing', 'Fantastic'}
-    locations = [loc for loc in locations if loc not in false_positives and len(loc) > 2]
+    Captions from the same trip often repeat, so results are memoized.
+    """
+    # Only the first plausible location is wanted, so stop scanning as soon
+    # as one turns up rather than collecting every match of every pattern
+    for pattern in _LOCATION_PATTERNS:
+        for match in pattern.finditer(caption):
+            for loc in match.groups():
+                if loc not in _LOCATION_FALSE_POSITIVES and len(loc) > 2:
+                    return loc
     
-    return locations[0] if locations else None
+    return None
 
+@disk_cache(GEOCODE_CACHE, key=geocode_key)
 def geocode_location(location: str) -> Optional[Tuple[float, float, str, str, str]]:
     """Geocode a location using OpenStreetMap Nominatim"""
     try:
-        # Build URL with parameters
-        params = urllib.parse.urlencode({
+        params = {
             'q': location,
             'format': 'json',
             'limit': 1,
             'addressdetails': 1
-        })
-        url = f"https://nominatim.openstreetmap.org/search?{params}"
-        
-        # Create request with headers
-        req = urllib.request.Request(url)
-        req.add_header('User-Agent', 'WorldCoffeeTour/1.0 (https://worldcoffeetour.joegaudet.com)')
+        }
         
         # Make request
-        with urllib.request.urlopen(req, timeout=10) as response:
-            data = json.loads(response.read().decode())
+        response = _NOMINATIM.get("https://nominatim.openstreetmap.org/search", params=params, timeout=10)
+        response.raise_for_status()
+        data = response.json()
+        
+        if data:
+            result = data[0]
+            lat = float(result['lat'])
+            lon = float(result['lon'])
+            
+            # Extract address components
+            address = result.get('address', {})
+            city = (address.get('city') or 
+                   address.get('town') or 
+                   address.get('village') or 
+                   location)
+            country = address.get('country', 'Unknown')
+            
+            # Map country to continent
+            continent = CONTINENT_MAP.get(country.upper(), 'World')
+            
+            return lat, lon, city, country, continent
             
-            if data:
-                result = data[0]
-                lat = float(result['lat'])
-                lon = float(result['lon'])
-                
-                # Extract address components
-                address = result.get('address', {})
-                city = (address.get('city') or 
-                       address.get('town') or 
-                       address.get('village') or 
-                       location)
-                country = address.get('country', 'Unknown')
-                
-                # Map country to continent
-                continent_map = {
-                    'Canada': 'North America',
-                    'United States': 'North America', 
-                    'United States of America': 'North America',
-                    'Mexico': 'North America',
-                    'Chile': 'South America',
-                    'Argentina': 'South America',
-                    'Brazil': 'South America',
-                    'United Kingdom': 'Europe',
-                    'France': 'Europe',
-                    'Germany': 'Europe',
-                    'Italy': 'Europe',
-                    'Spain': 'Europe',
-                    'Japan': 'Asia',
-                    'China': 'Asia',
-                    'India': 'Asia',
-                    'Australia': 'Oceania',
-                    'New Zealand': 'Oceania'
-                }
-                continent = continent_map.get(country, 'World')
-                
-                return lat, lon, city, country, continent
-                
     except Exception as e:
         print(f"    ❌ Geocoding error for '{location}': {e}")
     
     return None
 
+@disk_cache(OVERPASS_CACHE, key=coordinate_key)
 def find_cafe_at_location(latitude: float, longitude: float, retries: int = 2) -> Optional[str]:
     """Find cafe names near coordinates using Overpass API"""
     for attempt in range(retries):
@@ -128,34 +235,29 @@ def find_cafe_at_location(latitude: float, longitude: float, retries: int = 2) -
             overpass_query = f"""
             [out:json][timeout:10];
             (
-              node["amenity"~"^(cafe|restaurant)$"](around:100,{latitude},{longitude});
-              way["amenity"~"^(cafe|restaurant)$"](around:100,{latitude},{longitude});
+              node["amenity"~"^(cafe|restaurant)$"](around:{CAFE_SEARCH_RADIUS},{latitude},{longitude});
+              way["amenity"~"^(cafe|restaurant)$"](around:{CAFE_SEARCH_RADIUS},{latitude},{longitude});
             );
             out center;
             """
             
-            # Create request
-            req = urllib.request.Request(
-                'https://overpass-api.de/api/interpreter',
-                data=overpass_query.encode('utf-8'),
-                headers={'User-Agent': 'WorldCoffeeTour/1.0'}
-            )
+            response = _OVERPASS.post('https://overpass-api.de/api/interpreter',
+                                      data=overpass_query.encode('utf-8'), timeout=15)
+            response.raise_for_status()
+            data = response.json()
+            cafes = []
             
-            with urllib.request.urlopen(req, timeout=15) as response:
-                data = json.loads(response.read().decode())
-                cafes = []
+            for element in data.get('elements', []):
+                name = element.get('tags', {}).get('name')
+                amenity = element.get('tags', {}).get('amenity')
                 
-                for element in data.get('elements', []):
-                    name = element.get('tags', {}).get('name')
-                    amenity = element.get('tags', {}).get('amenity')
-                    
-                    if name and amenity in ['cafe', 'restaurant']:
-                        cafes.append(name)
-                
-                if cafes:
-                    return cafes[0]  # Return first cafe found
+                if name and amenity in ['cafe', 'restaurant']:
+                    cafes.append(name)
+            
+            if cafes:
+                return cafes[0]  # Return first cafe found
                     
-        except (urllib.error.URLError, urllib.error.HTTPError) as e:
+        except requests.RequestException as e:
             if attempt < retries - 1:
                 print(f"    ⚠️ Overpass API attempt {attempt + 1} failed, retrying...")
                 time.sleep(2)
@@ -164,6 +266,93 @@ def find_cafe_at_location(latitude: float, longitude: float, retries: int = 2) -
     
     return None
 
+def find_cafes_bulk(coords: List[Tuple[float, float]], retries: int = 2) -> Dict[int, str]:
+    """Find a cafe name near each of several coordinates with one Overpass query
+    
+    Returns {index into coords: cafe name} for the coordinates that have one.
+    Cached coordinates are answered from disk and left out of the query.
+    """
+    cafes = {}
+    pending = {}
+    for index, (latitude, longitude) in enumerate(coords):
+        cached = cache_get(OVERPASS_CACHE, coordinate_key(latitude, longitude))
+        if cached is not None:
+            cafes[index] = cached
+        else:
+            pending[index] = (latitude, longitude)
+    
+    if not pending:
+        return cafes
+    
+    # One union of every search area; results are matched back to the posts by distance
+    clauses = ''.join(
+        f'node["amenity"~"^(cafe|restaurant)$"](around:{CAFE_SEARCH_RADIUS},{lat},{lon});'
+        f'way["amenity"~"^(cafe|restaurant)$"](around:{CAFE_SEARCH_RADIUS},{lat},{lon});'
+        for lat, lon in pending.values()
+    )
+    overpass_query = f"[out:json][timeout:60];({clauses});out center tags;"
+    
+    for attempt in range(retries):
+        try:
+            response = _OVERPASS.post('https://overpass-api.de/api/interpreter',
+                                      data=overpass_query.encode('utf-8'), timeout=90)
+            response.raise_for_status()
+            data = response.json()
+            break
+        except requests.RequestException as e:
+            if attempt < retries - 1:
+                print(f"    ⚠️ Overpass API attempt {attempt + 1} failed, retrying...")
+                time.sleep(2)
+            else:
+                print(f"    ❌ Overpass API error: {e}")
+                return cafes
+    
+    found = {}
+    for element in data.get('elements', []):
+        name = element.get('tags', {}).get('name')
+        amenity = element.get('tags', {}).get('amenity')
+        if not name or amenity not in ['cafe', 'restaurant']:
+            continue
+        
+        # Ways report their centre, which can sit a little outside the radius
+        lat = element.get('lat', element.get('center', {}).get('lat'))
+        lon = element.get('lon', element.get('center', {}).get('lon'))
+        if lat is None or lon is None:
+            continue
+        
+        # First cafe in the results wins for every post it is near
+        for index, (post_lat, post_lon) in pending.items():
+            if index not in found and haversine_meters(lat, lon, post_lat, post_lon) <= CAFE_SEARCH_RADIUS * 1.5:
+                found[index] = name
+    
+    cache_put(OVERPASS_CACHE, {coordinate_key(*pending[index]): name for index, name in found.items()})
+    cafes.update(found)
+    return cafes
+
+async def _geocode_all(locations: List[str]) -> Dict[str, Optional[Tuple[float, float, str, str, str]]]:
+    """Geocode distinct locations, spacing only real Nominatim requests a second apart"""
+    # Cached locations are answered straight away, before any lookup threads
+    # start, so the shelve file is never opened from two threads at once
+    results = {}
+    pending = []
+    for location in locations:
+        if cache_get(GEOCODE_CACHE, geocode_key(location)) is not None:
+            results[location] = geocode_location(location)
+        else:
+            pending.append(location)
+    
+    nominatim = asyncio.Semaphore(1)
+    
+    async def geocode_one(location):
+        async with nominatim:
+            result = await asyncio.to_thread(geocode_location, location)
+            await asyncio.sleep(NOMINATIM_INTERVAL)
+            return result
+    
+    lookups = await asyncio.gather(*(geocode_one(location) for location in pending))
+    results.update(zip(pending, lookups))
+    return results
+
 def analyze_posts():
     """Analyze posts and provide interactive lookup interface"""
     posts = load_posts()
@@ -172,8 +361,15 @@ def analyze_posts():
     
     missing_locations = []
     missing_cafes = []
+    geocoded = []
+    
+    # Try to extract location from each caption, then geocode every distinct
+    # location up front so repeats and cache hits cost nothing
+    location_hints = [extract_location_from_caption(post.get('title', '')) for post in posts]
+    distinct_locations = list(dict.fromkeys(hint for hint in location_hints if hint))
+    geo_results = asyncio.run(_geocode_all(distinct_locations)) if distinct_locations else {}
     
-    for i, post in enumerate(posts, 1):
+    for i, (post, location_hint) in enumerate(zip(posts, location_hints), 1):
         timestamp = post.get('creation_timestamp', 0)
         date = datetime.fromtimestamp(timestamp) if timestamp else datetime.now()
         caption = post.get('title', '')
@@ -181,32 +377,24 @@ def analyze_posts():
         print(f"\n[{i:2d}] {date.strftime('%Y-%m-%d')}")
         print(f"Caption: {caption[:100]}{'...' if len(caption) > 100 else ''}")
         
-        # Try to extract location from caption
-        location_hint = extract_location_from_caption(caption)
         if location_hint:
             print(f"📍 Detected location: {location_hint}")
             
-            # Try to geocode
-            geo_result = geocode_location(location_hint)
+            geo_result = geo_results.get(location_hint)
             if geo_result:
                 lat, lon, city, country, continent = geo_result
                 print(f"🌍 Geocoded: {city}, {country} ({continent}) - {lat:.4f}, {lon:.4f}")
                 
-                # Try to find cafe
-                cafe = find_cafe_at_location(lat, lon)
-                if cafe:
-                    print(f"☕ Found cafe: {cafe}")
-                else:
-                    print("☕ No cafe found at location")
-                    missing_cafes.append({
-                        'index': i,
-                        'date': date.strftime('%Y-%m-%d'),
-                        'location': location_hint,
-                        'coordinates': (lat, lon),
-                        'city': city,
-                        'country': country,
-                        'caption': caption
-                    })
+                # Cafes are looked up for every geocoded post at once below
+                geocoded.append({
+                    'index': i,
+                    'date': date.strftime('%Y-%m-%d'),
+                    'location': location_hint,
+                    'coordinates': (lat, lon),
+                    'city': city,
+                    'country': country,
+                    'caption': caption
+                })
             else:
                 print("❌ Could not geocode location")
                 missing_locations.append({
@@ -223,10 +411,18 @@ def analyze_posts():
                 'location': None,
                 'caption': caption
             })
-        
-        # Add delay to be respectful to APIs
-        if i % 5 == 0:
-            time.sleep(1)
+    
+    # Try to find cafes for all geocoded posts in a single Overpass request
+    if geocoded:
+        print(f"\n☕ Looking up cafes for {len(geocoded)} geocoded posts...")
+        cafes = find_cafes_bulk([item['coordinates'] for item in geocoded])
+        for n, item in enumerate(geocoded):
+            cafe = cafes.get(n)
+            if cafe:
+                print(f"[{item['index']:2d}] ☕ Found cafe: {cafe}")
+            else:
+                print(f"[{item['index']:2d}] ☕ No cafe found at location")
+                missing_cafes.append(item)
     
     # Summary
     print("\n" + "=" * 60)
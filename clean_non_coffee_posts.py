@@ -5,43 +5,60 @@ Removes posts that don't contain coffee-related terms
 """
 
 from coffee_db import CoffeeDatabase
+import re
 import sys
 
+# pyahocorasick finds any of the terms in a single pass over the text; without
+# it one regex alternation over every term does the same job
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# Coffee terms to look for
+COFFEE_TERMS = (
+    'coffee', 'cafe', 'café', 'worldcoffeetour', 'espresso', 'latte', 
+    'cappuccino', 'americano', 'macchiato', 'cortado', 'mocha', 
+    'cofee', 'coffe', 'barista', 'roast', 'beans', 'brew', 'roastery'
+)
+
+def build_coffee_matcher():
+    """Return a function reporting whether lowercased text contains any coffee term"""
+    if ahocorasick is not None:
+        automaton = ahocorasick.Automaton()
+        for term in COFFEE_TERMS:
+            automaton.add_word(term, term)
+        automaton.make_automaton()
+        return lambda text: next(automaton.iter(text), None) is not None
+    
+    pattern = re.compile('|'.join(re.escape(term) for term in COFFEE_TERMS))
+    return lambda text: pattern.search(text) is not None
+
+# Built once at import and shared by every caller
+has_coffee_term = build_coffee_matcher()
+
 def clean_non_coffee_posts():
     """Remove posts that don't contain coffee terms"""
     db = CoffeeDatabase()
     
-    # Coffee terms to look for
-    coffee_terms = [
-        'coffee', 'cafe', 'café', 'worldcoffeetour', 'espresso', 'latte', 
-        'cappuccino', 'americano', 'macchiato', 'cortado', 'mocha', 
-        'cofee', 'coffe', 'barista', 'roast', 'beans', 'brew', 'roastery'
-    ]
+    # Only posts added or edited since the last run need classifying (or all
+    # of them if COFFEE_TERMS changed); the result is stored with each post,
+    # so the filter below is an index lookup
+    classified = db.classify_coffee_posts(has_coffee_term, COFFEE_TERMS)
+    if classified:
+        print(f"🔎 Classified {classified} new or edited posts")
     
-    posts = db.get_all_posts()
-    print(f"📊 Current total posts: {len(posts)}")
+    total_posts = db.get_post_count()
+    print(f"📊 Current total posts: {total_posts}")
     
     # Identify non-coffee posts
-    non_coffee_posts = []
-    coffee_posts = []
-    geocoded_removed = 0
-    
-    for post in posts:
-        title = post.get('title', '').lower()
-        notes = post.get('notes', '').lower() if post.get('notes') else ''
-        text_to_check = title + ' ' + notes
-        
-        has_coffee = any(term in text_to_check for term in coffee_terms)
-        
-        if has_coffee:
-            coffee_posts.append(post)
-        else:
-            non_coffee_posts.append(post)
-            # Check if we're removing a geocoded post
-            if post.get('latitude') and post.get('longitude'):
-                geocoded_removed += 1
+    non_coffee_posts = list(db.iter_posts(
+        ['id', 'date', 'title', 'latitude', 'longitude'], where='has_coffee = 0', order_by='date DESC'
+    ))
+    coffee_count = total_posts - len(non_coffee_posts)
+    geocoded_removed = sum(1 for _, _, _, lat, lng in non_coffee_posts if lat and lng)
     
-    print(f"☕ Coffee posts to keep: {len(coffee_posts)}")
+    print(f"☕ Coffee posts to keep: {coffee_count}")
     print(f"❌ Non-coffee posts to remove: {len(non_coffee_posts)}")
     
     if geocoded_removed > 0:
@@ -49,26 +66,18 @@ def clean_non_coffee_posts():
         
         # Show geocoded posts that would be removed
         print("\n🌍 Geocoded posts that would be removed:")
-        for post in non_coffee_posts:
-            if post.get('latitude') and post.get('longitude'):
-                print(f"  {post['date']} - {post['title'][:60]}... (lat: {post['latitude']}, lng: {post['longitude']})")
+        for _, date, title, lat, lng in non_coffee_posts:
+            if lat and lng:
+                print(f"  {date} - {title[:60]}... (lat: {lat}, lng: {lng})")
     
-    # Remove non-coffee posts
-    removed_count = 0
-    for post in non_coffee_posts:
-        try:
-            db.delete_post(post['id'])
-            removed_count += 1
-        except Exception as e:
-            print(f"Error removing post {post['id']}: {e}")
+    # Remove non-coffee posts in one transaction
+    removed_count = db.delete_posts(post[0] for post in non_coffee_posts)
     
     print(f"\n✅ Removed {removed_count} non-coffee posts")
-    print(f"📊 Remaining posts: {len(coffee_posts)}")
+    print(f"📊 Remaining posts: {coffee_count}")
     
     # Show updated stats
-    remaining_posts = db.get_all_posts()
-    geocoded = [p for p in remaining_posts if p.get('latitude') and p.get('longitude')]
-    print(f"🌍 Geocoded posts remaining: {len(geocoded)}")
+    print(f"🌍 Geocoded posts remaining: {db.count_geocoded()}")
     
     db.close()
 
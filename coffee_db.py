@@ -7,9 +7,36 @@ Single source of truth for all post data
 import sqlite3
 import json
 import hashlib
+import functools
 from pathlib import Path
 from datetime import datetime
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson decodes the short images/metadata blobs several times faster; its
+# JSONDecodeError subclasses json.JSONDecodeError, so handlers stay the same
+_json_loads = orjson.loads if orjson is not None else json.loads
+
+# Text fields covered by search_posts and the full-text index
+SEARCH_FIELDS = ('title', 'notes', 'cafe_name', 'city', 'country')
+
+# Columns update_post can change, in the order they appear in its SET clause
+UPDATE_FIELDS = (
+    'title', 'date', 'city', 'country', 'continent', 'latitude', 'longitude',
+    'cafe_name', 'rating', 'notes', 'images', 'instagram_url', 'published'
+)
+
+@functools.lru_cache(maxsize=None)
+def _update_sql(fields):
+    """UPDATE statement setting the given fields; built once per field combination"""
+    set_clauses = [f'{field} = ?' for field in fields]
+    # Always update the timestamp
+    set_clauses.append('updated_at = CURRENT_TIMESTAMP')
+    return f"UPDATE posts SET {', '.join(set_clauses)} WHERE id = ?"
+
 class CoffeeDatabase:
     def __init__(self, db_path='coffee_posts.db'):
         self.db_path = db_path
@@ -40,20 +67,105 @@ class CoffeeDatabase:
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 original_filename TEXT,
-                metadata TEXT  -- JSON for any extra fields
+                metadata TEXT,  -- JSON for any extra fields
+                has_coffee INTEGER  -- cached coffee-term match, NULL until classified
             )
         ''')
         
+        # Databases created before has_coffee existed get the column added
+        self.cursor.execute('PRAGMA table_info(posts)')
+        if 'has_coffee' not in {row['name'] for row in self.cursor.fetchall()}:
+            self.cursor.execute('ALTER TABLE posts ADD COLUMN has_coffee INTEGER')
+        
+        # Small key/value store for database-wide settings, such as which
+        # coffee term list the has_coffee flags were computed with
+        self.cursor.execute('''
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )
+        ''')
+        
+        # An edited title or notes invalidates the cached classification
+        self.cursor.execute('''
+            CREATE TRIGGER IF NOT EXISTS posts_has_coffee_reset AFTER UPDATE OF title, notes ON posts BEGIN
+                UPDATE posts SET has_coffee = NULL WHERE id = new.id;
+            END
+        ''')
+        
         # Create indexes for common queries
-        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_date ON posts(date)')
+        # Date lookups use the leading column of this index, and duplicate
+        # detection groups on all three, so it replaces the old date index
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_date_location ON posts(date, city, country)')
+        self.cursor.execute('DROP INDEX IF EXISTS idx_date')
         self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_continent ON posts(continent)')
         self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_country ON posts(country)')
         self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_city ON posts(city)')
-        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_published ON posts(published)')
+        # Published posts newest first come straight off this index with no
+        # sort step; it also covers plain published lookups, so the old
+        # single-column index is dropped
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_published_date ON posts(published, date DESC)')
+        self.cursor.execute('DROP INDEX IF EXISTS idx_published')
         self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_hash ON posts(hash)')
+        self.cursor.execute('CREATE INDEX IF NOT EXISTS idx_has_coffee ON posts(has_coffee)')
+        
+        # WAL with NORMAL sync commits without an fsync per transaction and
+        # lets readers carry on while a write is in progress
+        self.cursor.execute('PRAGMA journal_mode=WAL')
+        self.cursor.execute('PRAGMA synchronous=NORMAL')
+        
+        self.init_search_index()
         
         self.conn.commit()
     
+    def init_search_index(self):
+        """Create the full-text search index over posts, if SQLite supports it
+        
+        The trigram tokenizer indexes every 3-character substring, so MATCH
+        keeps the case-insensitive substring semantics of LIKE '%query%'.
+        Triggers keep the index in step with the posts table.
+        """
+        self.cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'posts_fts'")
+        exists = self.cursor.fetchone() is not None
+        
+        try:
+            self.cursor.execute(f'''
+                CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+                    {', '.join(SEARCH_FIELDS)},
+                    content='posts', content_rowid='id', tokenize='trigram'
+                )
+            ''')
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5 (or older than 3.34) - search falls back to LIKE
+            self.fts_enabled = False
+            return
+        
+        columns = ', '.join(SEARCH_FIELDS)
+        new_values = ', '.join(f'new.{field}' for field in SEARCH_FIELDS)
+        old_values = ', '.join(f'old.{field}' for field in SEARCH_FIELDS)
+        self.cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS posts_fts_insert AFTER INSERT ON posts BEGIN
+                INSERT INTO posts_fts(rowid, {columns}) VALUES (new.id, {new_values});
+            END
+        ''')
+        self.cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS posts_fts_delete AFTER DELETE ON posts BEGIN
+                INSERT INTO posts_fts(posts_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+            END
+        ''')
+        self.cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS posts_fts_update AFTER UPDATE OF {columns} ON posts BEGIN
+                INSERT INTO posts_fts(posts_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+                INSERT INTO posts_fts(rowid, {columns}) VALUES (new.id, {new_values});
+            END
+        ''')
+        
+        # Index the posts that were already there when the index was created
+        if not exists:
+            self.cursor.execute("INSERT INTO posts_fts(posts_fts) VALUES ('rebuild')")
+        
+        self.fts_enabled = True
+    
     def generate_hash(self, data):
         """Generate a unique hash for a post based on key content"""
         # Use title, date, and first image (if available) to create unique hash
@@ -71,22 +183,44 @@ class CoffeeDatabase:
         images = data.get('images', [])
         if images:
             if isinstance(images, str):
-                images = json.loads(images)
-            if images and len(images) > 0:
+                images = _json_loads(images)
+            if images:
                 hash_parts.append(images[0])  # First image URL
         
         # Fallback to timestamp if no meaningful data
         if not hash_parts:
             hash_parts.append(str(datetime.now().timestamp()))
         
-        hash_string = '|'.join(hash_parts)
-        return hashlib.sha256(hash_string.encode()).hexdigest()
+        # Stored hashes are hex strings, so the format has to stay as it is or
+        # every existing post would stop matching on its next upsert
+        return hashlib.sha256('|'.join(hash_parts).encode()).hexdigest()
     
-    def upsert_post(self, data):
-        """Insert or update a post (idempotent operation)"""
-        # Generate hash
-        post_hash = self.generate_hash(data)
-        
+    # Columns written by upsert_post/upsert_posts, in parameter order. On a
+    # hash conflict every column except hash and original_filename is updated,
+    # but only if one of them actually changed - re-importing an unchanged
+    # post leaves the row, its updated_at and the search index alone.
+    _UPSERT_COLUMNS = (
+        'hash', 'title', 'date', 'city', 'country', 'continent',
+        'latitude', 'longitude', 'cafe_name', 'rating', 'notes',
+        'images', 'instagram_url', 'published', 'original_filename', 'metadata'
+    )
+    _UPSERT_UPDATED = tuple(c for c in _UPSERT_COLUMNS if c not in ('hash', 'original_filename'))
+    _UPSERT_SQL = '''
+        INSERT INTO posts ({columns}) VALUES ({placeholders})
+        ON CONFLICT(hash) DO UPDATE SET
+            {updates},
+            updated_at = CURRENT_TIMESTAMP
+        WHERE ({updated}) IS NOT ({excluded})
+    '''.format(
+        columns=', '.join(_UPSERT_COLUMNS),
+        placeholders=', '.join('?' * len(_UPSERT_COLUMNS)),
+        updates=',\n            '.join(f'{column} = excluded.{column}' for column in _UPSERT_UPDATED),
+        updated=', '.join(_UPSERT_UPDATED),
+        excluded=', '.join(f'excluded.{column}' for column in _UPSERT_UPDATED)
+    )
+    
+    def _upsert_params(self, data):
+        """Build the upsert parameter tuple for a post"""
         # Convert images list to JSON
         images = data.get('images', [])
         if isinstance(images, list):
@@ -108,91 +242,88 @@ class CoffeeDatabase:
         
         metadata_json = json.dumps(metadata) if metadata else None
         
-        # Try to insert, update if exists
-        try:
-            self.cursor.execute('''
-                INSERT INTO posts (
-                    hash, title, date, city, country, continent,
-                    latitude, longitude, cafe_name, rating, notes,
-                    images, instagram_url, published, original_filename, metadata
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                post_hash,
-                data.get('title'),
-                data.get('date'),
-                data.get('city', 'Unknown'),
-                data.get('country', 'Unknown'),
-                data.get('continent', 'Unknown'),
-                data.get('latitude'),
-                data.get('longitude'),
-                data.get('cafe_name'),
-                data.get('rating'),
-                data.get('notes'),
-                images_json,
-                data.get('instagram_url'),
-                data.get('published', True),
-                data.get('original_filename'),
-                metadata_json
-            ))
-            self.conn.commit()
-            return self.cursor.lastrowid, 'inserted'
-            
-        except sqlite3.IntegrityError:
-            # Hash exists, update the record
-            self.cursor.execute('''
-                UPDATE posts SET
-                    title = ?,
-                    date = ?,
-                    city = ?,
-                    country = ?,
-                    continent = ?,
-                    latitude = ?,
-                    longitude = ?,
-                    cafe_name = ?,
-                    rating = ?,
-                    notes = ?,
-                    images = ?,
-                    instagram_url = ?,
-                    published = ?,
-                    metadata = ?,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE hash = ?
-            ''', (
-                data.get('title'),
-                data.get('date'),
-                data.get('city', 'Unknown'),
-                data.get('country', 'Unknown'),
-                data.get('continent', 'Unknown'),
-                data.get('latitude'),
-                data.get('longitude'),
-                data.get('cafe_name'),
-                data.get('rating'),
-                data.get('notes'),
-                images_json,
-                data.get('instagram_url'),
-                data.get('published', True),
-                metadata_json,
-                post_hash
-            ))
-            self.conn.commit()
-            return self.cursor.lastrowid, 'updated'
+        return (
+            self.generate_hash(data),
+            data.get('title'),
+            data.get('date'),
+            data.get('city', 'Unknown'),
+            data.get('country', 'Unknown'),
+            data.get('continent', 'Unknown'),
+            data.get('latitude'),
+            data.get('longitude'),
+            data.get('cafe_name'),
+            data.get('rating'),
+            data.get('notes'),
+            images_json,
+            data.get('instagram_url'),
+            data.get('published', True),
+            data.get('original_filename'),
+            metadata_json
+        )
+    
+    def upsert_post(self, data):
+        """Insert or update a post (idempotent operation)
+        
+        Returns (post_id, action), where action is 'inserted', 'updated' or
+        'unchanged'.
+        """
+        params = self._upsert_params(data)
+        
+        # The indexed hash lookup only tells the caller which action happened;
+        # the write itself is a single INSERT ... ON CONFLICT statement
+        self.cursor.execute('SELECT id FROM posts WHERE hash = ?', (params[0],))
+        existing = self.cursor.fetchone()
+        
+        with self.conn:
+            self.cursor.execute(self._UPSERT_SQL + ' RETURNING id', params)
+            # No row comes back when an existing post had nothing to change
+            written = self.cursor.fetchone()
+        
+        if not existing:
+            return written['id'], 'inserted'
+        return existing['id'], 'updated' if written else 'unchanged'
+    
+    def upsert_posts(self, posts):
+        """Insert or update many posts in one transaction; returns the number written
+        
+        Posts that already exist unchanged aren't written or counted.
+        """
+        rows = [self._upsert_params(data) for data in posts]
+        with self.conn:
+            self.cursor.executemany(self._UPSERT_SQL, rows)
+        return self.cursor.rowcount
     
-    def get_all_posts(self, published_only=False):
-        """Get all posts from the database"""
+    def get_all_posts(self, published_only=False, parse_json=True):
+        """Get all posts from the database
+        
+        With parse_json=False the images and metadata columns are left as raw
+        JSON text and metadata isn't merged in, for callers that only need
+        the plain columns.
+        """
+        return list(self.iter_all_posts(published_only, parse_json))
+    
+    def iter_all_posts(self, published_only=False, parse_json=True):
+        """Yield posts one at a time, as get_all_posts returns them
+        
+        Rows are read from the cursor as the caller iterates, so only one
+        post is held in memory at a time.
+        """
         if published_only:
             query = 'SELECT * FROM posts WHERE published = 1 ORDER BY date DESC'
         else:
             query = 'SELECT * FROM posts ORDER BY date DESC'
         
-        self.cursor.execute(query)
-        posts = []
-        
-        for row in self.cursor.fetchall():
+        # A cursor of its own, so the caller can use the database mid-iteration
+        for row in self.conn.execute(query):
             post = dict(row)
+            if not parse_json:
+                yield post
+                continue
+            
             # Parse JSON fields
             if post['images']:
                 try:
-                    post['images'] = json.loads(post['images'])
+                    post['images'] = _json_loads(post['images'])
                 except (json.JSONDecodeError, TypeError):
                     print(f"Warning: Invalid JSON in images field for post {post.get('id')}: {post['images']}")
                     post['images'] = []
@@ -200,12 +331,60 @@ class CoffeeDatabase:
                 post['images'] = []
             
             if post['metadata']:
-                metadata = json.loads(post['metadata'])
+                metadata = _json_loads(post['metadata'])
                 post.update(metadata)
             
-            posts.append(post)
-        
-        return posts
+            yield post
+    
+    def iter_posts(self, columns, where=None, params=(), order_by=None):
+        """Yield plain tuples of just the given columns, without building dicts
+        
+        where and order_by are SQL fragments; params are bound into where.
+        """
+        sql = f"SELECT {', '.join(columns)} FROM posts"
+        if where:
+            sql += f" WHERE {where}"
+        if order_by:
+            sql += f" ORDER BY {order_by}"
+        
+        # A separate cursor without the Row factory, so rows stay bare tuples
+        cursor = self.conn.cursor()
+        cursor.row_factory = None
+        yield from cursor.execute(sql, params)
+    
+    def get_posts_for_dedup(self, post_ids=None):
+        """Get posts with only the columns duplicate detection reads
+        
+        notes is replaced by its length (notes_len) and images is left as raw
+        JSON text. post_ids limits the result to those posts.
+        """
+        query = '''
+            SELECT id, images, date, city, country, instagram_url, cafe_name,
+                   latitude, longitude, rating, LENGTH(notes) AS notes_len
+            FROM posts
+        '''
+        params = ()
+        if post_ids is not None:
+            # The ids go in as one JSON array, so there's no bound-parameter limit
+            query += ' WHERE id IN (SELECT value FROM json_each(?))'
+            params = (json.dumps(list(post_ids)),)
+        
+        self.cursor.execute(query + ' ORDER BY date DESC, id DESC', params)
+        return [dict(row) for row in self.cursor.fetchall()]
+    
+    def get_duplicate_id_groups(self, group_by, where):
+        """Get the ids of each group of posts sharing a group_by value
+        
+        group_by and where are SQL fragments; only groups of two or more posts
+        are returned.
+        """
+        self.cursor.execute(f'''
+            SELECT GROUP_CONCAT(id) AS ids FROM posts
+            WHERE {where}
+            GROUP BY {group_by}
+            HAVING COUNT(*) > 1
+        ''')
+        return [[int(post_id) for post_id in row['ids'].split(',')] for row in self.cursor.fetchall()]
     
     def get_post_by_id(self, post_id):
         """Get a single post by ID"""
@@ -228,81 +407,22 @@ class CoffeeDatabase:
     
     def update_post(self, post_id, data):
         """Update a post by ID - supports partial updates"""
-        # Build SET clause dynamically for only provided fields
-        set_clauses = []
+        # Only provided fields are set, in a fixed order so each combination
+        # of fields always produces the same SQL text
+        fields = tuple(field for field in UPDATE_FIELDS if field in data)
         params = []
         
-        # Handle each field that might be updated
-        if 'title' in data:
-            set_clauses.append('title = ?')
-            params.append(data['title'])
-            
-        if 'date' in data:
-            set_clauses.append('date = ?')
-            params.append(data['date'])
-            
-        if 'city' in data:
-            set_clauses.append('city = ?')
-            params.append(data['city'])
-            
-        if 'country' in data:
-            set_clauses.append('country = ?')
-            params.append(data['country'])
-            
-        if 'continent' in data:
-            set_clauses.append('continent = ?')
-            params.append(data['continent'])
-            
-        if 'latitude' in data:
-            set_clauses.append('latitude = ?')
-            params.append(data['latitude'])
-            
-        if 'longitude' in data:
-            set_clauses.append('longitude = ?')
-            params.append(data['longitude'])
-            
-        if 'cafe_name' in data:
-            set_clauses.append('cafe_name = ?')
-            params.append(data['cafe_name'])
-            
-        if 'rating' in data:
-            set_clauses.append('rating = ?')
-            params.append(data['rating'])
-            
-        if 'notes' in data:
-            set_clauses.append('notes = ?')
-            params.append(data['notes'])
-            
-        if 'images' in data:
-            images = data['images']
-            if isinstance(images, list):
-                images_json = json.dumps(images)
-            else:
-                images_json = images
-            set_clauses.append('images = ?')
-            params.append(images_json)
-            
-        if 'instagram_url' in data:
-            set_clauses.append('instagram_url = ?')
-            params.append(data['instagram_url'])
-            
-        if 'published' in data:
-            set_clauses.append('published = ?')
-            params.append(data['published'])
-        
-        # Always update the timestamp
-        set_clauses.append('updated_at = CURRENT_TIMESTAMP')
+        for field in fields:
+            value = data[field]
+            if field == 'images' and isinstance(value, list):
+                value = json.dumps(value)
+            params.append(value)
         
-        if not set_clauses:
-            return False  # No fields to update
-            
         # Add post_id to params
         params.append(post_id)
         
-        sql = f"UPDATE posts SET {', '.join(set_clauses)} WHERE id = ?"
-        
-        self.cursor.execute(sql, params)
-        self.conn.commit()
+        with self.conn:
+            self.cursor.execute(_update_sql(fields), params)
         return self.cursor.rowcount > 0
     
     def delete_post(self, post_id):
@@ -311,10 +431,50 @@ class CoffeeDatabase:
         self.conn.commit()
         return self.cursor.rowcount > 0
     
+    def delete_posts(self, post_ids, chunk_size=500):
+        """Delete many posts by ID in one transaction; returns the number deleted
+        
+        IDs are deleted in chunks to stay under SQLite's bound-parameter limit.
+        If a chunk fails, its posts are retried one at a time and any that
+        still fail are reported and skipped.
+        """
+        post_ids = list(post_ids)
+        deleted = 0
+        
+        with self.conn:
+            for start in range(0, len(post_ids), chunk_size):
+                chunk = post_ids[start:start + chunk_size]
+                placeholders = ','.join('?' * len(chunk))
+                try:
+                    self.cursor.execute(f'DELETE FROM posts WHERE id IN ({placeholders})', chunk)
+                    deleted += self.cursor.rowcount
+                except sqlite3.Error:
+                    for post_id in chunk:
+                        try:
+                            self.cursor.execute('DELETE FROM posts WHERE id = ?', (post_id,))
+                            deleted += self.cursor.rowcount
+                        except sqlite3.Error as e:
+                            print(f"Error removing post {post_id}: {e}")
+        
+        return deleted
+    
     def search_posts(self, query, fields=None):
         """Search posts across specified fields"""
         if fields is None:
-            fields = ['title', 'notes', 'cafe_name', 'city', 'country']
+            fields = SEARCH_FIELDS
+        
+        # Trigrams can't match queries shorter than three characters, and
+        # only the indexed fields can be searched through the index
+        if self.fts_enabled and len(query) >= 3 and set(fields) <= set(SEARCH_FIELDS):
+            # A quoted FTS5 string matches the query as a literal substring
+            match = '{%s}: "%s"' % (' '.join(fields), query.replace('"', '""'))
+            self.cursor.execute('''
+                SELECT posts.* FROM posts_fts
+                JOIN posts ON posts.id = posts_fts.rowid
+                WHERE posts_fts MATCH ?
+                ORDER BY posts.date DESC
+            ''', (match,))
+            return self.decode_search_rows(self.cursor.fetchall())
         
         conditions = []
         params = []
@@ -327,9 +487,13 @@ class CoffeeDatabase:
         sql = f"SELECT * FROM posts WHERE {where_clause} ORDER BY date DESC"
         
         self.cursor.execute(sql, params)
+        return self.decode_search_rows(self.cursor.fetchall())
+    
+    def decode_search_rows(self, rows):
+        """Convert search result rows to post dicts"""
         posts = []
         
-        for row in self.cursor.fetchall():
+        for row in rows:
             post = dict(row)
             if post['images']:
                 post['images'] = json.loads(post['images'])
@@ -466,6 +630,43 @@ class CoffeeDatabase:
         self.cursor.execute('SELECT COUNT(*) as count FROM posts')
         return self.cursor.fetchone()['count']
     
+    def classify_coffee_posts(self, has_coffee_term, coffee_terms):
+        """Fill in has_coffee for posts not yet classified; returns how many were
+        
+        has_coffee_term is called with each post's lowercased title and notes,
+        and matches the terms in coffee_terms. Classified posts keep their flag
+        until their title or notes change, or until coffee_terms differs from
+        the list the flags were computed with, which reclassifies every post.
+        """
+        terms_digest = hashlib.sha256('\n'.join(sorted(coffee_terms)).encode('utf-8')).hexdigest()
+        
+        with self.conn:
+            self.cursor.execute("SELECT value FROM meta WHERE key = 'coffee_terms_digest'")
+            row = self.cursor.fetchone()
+            if row is None or row['value'] != terms_digest:
+                self.cursor.execute('UPDATE posts SET has_coffee = NULL')
+                self.cursor.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('coffee_terms_digest', ?)",
+                    (terms_digest,)
+                )
+            
+            self.cursor.execute('SELECT id, title, notes FROM posts WHERE has_coffee IS NULL')
+            rows = [
+                (int(has_coffee_term(f"{title or ''} {notes or ''}".lower())), post_id)
+                for post_id, title, notes in self.cursor.fetchall()
+            ]
+            self.cursor.executemany('UPDATE posts SET has_coffee = ? WHERE id = ?', rows)
+        return len(rows)
+    
+    def count_geocoded(self):
+        """Get number of posts with coordinates"""
+        self.cursor.execute('''
+            SELECT COUNT(*) as count 
+            FROM posts 
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        ''')
+        return self.cursor.fetchone()['count']
+    
     def get_continents(self):
         """Get list of all continents"""
         self.cursor.execute('''
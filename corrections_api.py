@@ -5,15 +5,42 @@ Simple API server for post corrections using SQLite
 
 import json
 import sys
-import subprocess
+import queue
+import threading
 from http.server import HTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 from post_corrections_db import PostCorrectionsDB
 
+# Corrections are applied to the Jekyll posts one run at a time on a single
+# worker thread. Saves that arrive while a run is already queued collapse into it.
+_apply_queue = queue.Queue()
+_apply_pending = threading.Event()
+
+def _apply_worker():
+    from apply_corrections_sqlite import apply_corrections_to_posts
+    while True:
+        _apply_queue.get()
+        # Clear before running so a save made mid-run queues a fresh pass
+        _apply_pending.clear()
+        try:
+            # No process pool: forking from this threaded server isn't safe
+            apply_corrections_to_posts(silent=True, parallel=False)
+        except Exception as e:
+            print(f"❌ Applying corrections failed: {e}")
+        finally:
+            _apply_queue.task_done()
+
+def queue_apply():
+    """Schedule applying corrections; returns False if a run is already queued"""
+    if _apply_pending.is_set():
+        return False
+    _apply_pending.set()
+    _apply_queue.put('apply')
+    return True
+
 class CorrectionsHandler(BaseHTTPRequestHandler):
-    def __init__(self, *args, **kwargs):
-        self.db = PostCorrectionsDB()
-        super().__init__(*args, **kwargs)
+    # Shared by every request; run_server sets it up once at startup
+    db = None
     
     def do_GET(self):
         """Handle GET requests - retrieve corrections"""
@@ -54,33 +81,12 @@ class CorrectionsHandler(BaseHTTPRequestHandler):
                 # Save to database
                 self.db.save_corrections(corrections_data)
                 
-                # Auto-apply corrections to Jekyll posts
-                try:
-                    result = subprocess.run([
-                        'python3', 'apply_corrections_sqlite.py', '--silent'
-                    ], capture_output=True, text=True, timeout=30)
-                    
-                    if result.returncode == 0:
-                        self.send_json_response({
-                            "success": True, 
-                            "message": "Corrections saved and applied to Jekyll posts"
-                        })
-                    else:
-                        self.send_json_response({
-                            "success": True, 
-                            "message": "Corrections saved but failed to apply to posts",
-                            "apply_error": result.stderr
-                        })
-                except subprocess.TimeoutExpired:
-                    self.send_json_response({
-                        "success": True,
-                        "message": "Corrections saved but apply timed out"
-                    })
-                except Exception as apply_error:
-                    self.send_json_response({
-                        "success": True,
-                        "message": f"Corrections saved but apply failed: {apply_error}"
-                    })
+                # Apply corrections to Jekyll posts in the background
+                queue_apply()
+                self.send_json_response({
+                    "success": True,
+                    "message": "Corrections saved; applying to Jekyll posts"
+                })
             except Exception as e:
                 self.send_error_response(str(e))
         
@@ -107,33 +113,12 @@ class CorrectionsHandler(BaseHTTPRequestHandler):
                 post_id = self.path[13:]  # Remove '/corrections/'
                 self.db.delete_correction(post_id)
                 
-                # Auto-apply corrections to Jekyll posts
-                try:
-                    result = subprocess.run([
-                        'python3', 'apply_corrections_sqlite.py', '--silent'
-                    ], capture_output=True, text=True, timeout=30)
-                    
-                    if result.returncode == 0:
-                        self.send_json_response({
-                            "success": True, 
-                            "message": "Correction deleted and changes applied to Jekyll posts"
-                        })
-                    else:
-                        self.send_json_response({
-                            "success": True, 
-                            "message": "Correction deleted but failed to apply changes to posts",
-                            "apply_error": result.stderr
-                        })
-                except subprocess.TimeoutExpired:
-                    self.send_json_response({
-                        "success": True,
-                        "message": "Correction deleted but apply timed out"
-                    })
-                except Exception as apply_error:
-                    self.send_json_response({
-                        "success": True,
-                        "message": f"Correction deleted but apply failed: {apply_error}"
-                    })
+                # Apply corrections to Jekyll posts in the background
+                queue_apply()
+                self.send_json_response({
+                    "success": True,
+                    "message": "Correction deleted; applying to Jekyll posts"
+                })
             except Exception as e:
                 self.send_error_response(str(e))
         else:
@@ -177,6 +162,8 @@ class CorrectionsHandler(BaseHTTPRequestHandler):
 def run_server(port=8001):
     """Run the corrections API server"""
     server_address = ('', port)
+    CorrectionsHandler.db = PostCorrectionsDB()
+    threading.Thread(target=_apply_worker, daemon=True).start()
     httpd = HTTPServer(server_address, CorrectionsHandler)
     print(f"🗄️  Corrections API server running on http://localhost:{port}")
     print("   Available endpoints:")
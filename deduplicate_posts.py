@@ -5,9 +5,21 @@ Find and remove true duplicate posts based on invariant characteristics
 
 from coffee_db import CoffeeDatabase
 import json
-from collections import defaultdict
+import functools
 from datetime import datetime
 
+# Dedup keys as (match type, SQL GROUP BY, SQL WHERE), most reliable first.
+# dedup_image_key and instagram_post_id are registered by find_duplicates.
+_DEDUP_KEYS = (
+    # Primary key: Image URL (most reliable)
+    ('image', 'dedup_image_key(images)', 'dedup_image_key(images) IS NOT NULL'),
+    # Instagram post ID, when the post links to Instagram
+    ('instagram', 'instagram_post_id(instagram_url)', 'instagram_post_id(instagram_url) IS NOT NULL'),
+    # Date + Location, skipping posts whose location isn't known
+    ('date_location', 'date, city, country',
+     "date != '' AND city != '' AND country != '' AND date || city || country NOT LIKE '%unknown%'"),
+)
+
 def normalize_image_url(url):
     """Normalize image URL to find duplicates even if URL format changed"""
     if not url:
@@ -34,12 +46,15 @@ def normalize_image_url(url):
     # For other URLs, use the full URL
     return url
 
-def create_dedup_key(post):
-    """Create a deduplication key based on invariant characteristics"""
-    keys = []
-    
-    # Primary key: Image URL (most reliable)
-    images = post.get('images', [])
+# SQLite evaluates a key function once for WHERE and again for GROUP BY on
+# the same row, so a small cache lets each row's key be computed only once
+@functools.lru_cache(maxsize=256)
+def image_dedup_key(images):
+    """Normalized first image of a post's images column, or None
+    
+    An empty normalized key (e.g. a path with no filename) is no key at all,
+    so such posts are never grouped together.
+    """
     if images:
         if isinstance(images, str):
             try:
@@ -47,127 +62,105 @@ def create_dedup_key(post):
             except:
                 images = [images]
         if images and images[0]:
-            normalized_img = normalize_image_url(images[0])
-            if normalized_img:
-                keys.append(('image', normalized_img))
-    
-    # Secondary key: Date + Location (for posts without images)
-    date = post.get('date')
-    city = post.get('city')
-    country = post.get('country')
-    
-    if date:
-        location_key = f"{date}|{city or 'unknown'}|{country or 'unknown'}"
-        keys.append(('date_location', location_key))
-    
-    # Tertiary key: Instagram URL if available
-    instagram_url = post.get('instagram_url')
+            return normalize_image_url(images[0]) or None
+    return None
+
+@functools.lru_cache(maxsize=256)
+def instagram_post_id(instagram_url):
+    """Post ID from an Instagram post URL, or None (including for an empty ID)"""
     if instagram_url and 'instagram.com' in instagram_url:
-        # Extract the post ID from URL
         parts = instagram_url.split('/')
         for i, part in enumerate(parts):
             if part == 'p' and i + 1 < len(parts):
-                keys.append(('instagram_id', parts[i + 1]))
-                break
-    
-    return keys
+                return parts[i + 1] or None
+    return None
 
 def find_duplicates():
     """Find all duplicate posts in the database"""
     db = CoffeeDatabase()
-    posts = db.get_all_posts()
-    
-    print(f"📊 Analyzing {len(posts)} posts for duplicates...")
-    
-    # Group posts by their dedup keys
-    image_groups = defaultdict(list)
-    date_location_groups = defaultdict(list)
-    instagram_groups = defaultdict(list)
-    
-    for post in posts:
-        keys = create_dedup_key(post)
-        for key_type, key_value in keys:
-            if key_type == 'image':
-                image_groups[key_value].append(post)
-            elif key_type == 'date_location':
-                date_location_groups[key_value].append(post)
-            elif key_type == 'instagram_id':
-                instagram_groups[key_value].append(post)
+    db.conn.create_function('dedup_image_key', 1, image_dedup_key, deterministic=True)
+    db.conn.create_function('instagram_post_id', 1, instagram_post_id, deterministic=True)
+    
+    print(f"📊 Analyzing {db.get_post_count()} posts for duplicates...")
+    
+    # SQLite does the grouping, so only posts that share a key come back
+    id_groups = [
+        (match_type, ids)
+        for match_type, group_by, where in _DEDUP_KEYS
+        for ids in db.get_duplicate_id_groups(group_by, where)
+    ]
+    candidate_ids = {post_id for _, ids in id_groups for post_id in ids}
+    posts = {post['id']: post for post in db.get_posts_for_dedup(candidate_ids)}
+    # Posts within a group are listed newest first
+    position = {post_id: i for i, post_id in enumerate(posts)}
     
     # Find duplicate groups
     duplicate_groups = []
+    potential_duplicates = []
     processed_ids = set()
     
-    # Check image duplicates (highest confidence)
-    for img_key, group in image_groups.items():
-        if len(group) > 1:
-            group_ids = [p['id'] for p in group]
-            if not any(pid in processed_ids for pid in group_ids):
-                duplicate_groups.append(('image', group))
-                processed_ids.update(group_ids)
-    
-    # Check Instagram ID duplicates
-    for ig_key, group in instagram_groups.items():
-        if len(group) > 1:
-            group_ids = [p['id'] for p in group]
-            if not any(pid in processed_ids for pid in group_ids):
-                duplicate_groups.append(('instagram', group))
-                processed_ids.update(group_ids)
-    
-    # Check date+location duplicates (lower confidence, need manual review)
-    potential_duplicates = []
-    for dl_key, group in date_location_groups.items():
-        if len(group) > 1 and 'unknown' not in dl_key.lower():
-            group_ids = [p['id'] for p in group]
-            if not any(pid in processed_ids for pid in group_ids):
-                # These might be different cafes visited on the same day in same city
-                potential_duplicates.append(('date_location', group))
+    for match_type, group_ids in id_groups:
+        if any(pid in processed_ids for pid in group_ids):
+            continue
+        group = [posts[pid] for pid in sorted(group_ids, key=position.get)]
+        
+        if match_type == 'date_location':
+            # Lower confidence, need manual review - these might be different
+            # cafes visited on the same day in same city
+            potential_duplicates.append(('date_location', group))
+        else:
+            duplicate_groups.append((match_type, group))
+            processed_ids.update(group_ids)
     
     return duplicate_groups, potential_duplicates
 
+# Placeholder cafe names that don't count as a real name
+_BAD_CAFE_NAMES = frozenset({'Unknown', 'None', 'worldcoffee', 'Worldcoffeetour'})
+
+def _score(post):
+    """Completeness score used to pick which duplicate to keep"""
+    get = post.get
+    score = 0
+    
+    # Prefer posts with cafe names
+    cafe_name = get('cafe_name')
+    if cafe_name and cafe_name not in _BAD_CAFE_NAMES:
+        score += 10
+    
+    # Prefer posts with locations
+    city = get('city')
+    if city and city != 'Unknown':
+        score += 5
+    country = get('country')
+    if country and country != 'Unknown':
+        score += 5
+    
+    # Prefer posts with coordinates
+    if get('latitude') and get('longitude'):
+        score += 8
+    
+    # Prefer posts with notes
+    notes_len = get('notes_len')
+    if notes_len:
+        score += notes_len // 100  # Longer notes = better
+    
+    # Prefer posts with ratings
+    if get('rating'):
+        score += 3
+    
+    # Prefer posts with Instagram URLs
+    if get('instagram_url'):
+        score += 2
+    
+    # Prefer newer database entries (likely more complete)
+    score += get('id', 0) / 1000  # Small boost for newer IDs
+    
+    return score
+
 def select_best_post(posts):
     """Select the best post from a group of duplicates"""
-    # Score each post
-    scored_posts = []
-    
-    for post in posts:
-        score = 0
-        
-        # Prefer posts with cafe names
-        if post.get('cafe_name') and post['cafe_name'] not in ['Unknown', 'None', 'worldcoffee', 'Worldcoffeetour']:
-            score += 10
-        
-        # Prefer posts with locations
-        if post.get('city') and post['city'] != 'Unknown':
-            score += 5
-        if post.get('country') and post['country'] != 'Unknown':
-            score += 5
-        
-        # Prefer posts with coordinates
-        if post.get('latitude') and post.get('longitude'):
-            score += 8
-        
-        # Prefer posts with notes
-        if post.get('notes'):
-            score += len(post['notes']) // 100  # Longer notes = better
-        
-        # Prefer posts with ratings
-        if post.get('rating'):
-            score += 3
-        
-        # Prefer posts with Instagram URLs
-        if post.get('instagram_url'):
-            score += 2
-        
-        # Prefer newer database entries (likely more complete)
-        score += post.get('id', 0) / 1000  # Small boost for newer IDs
-        
-        scored_posts.append((score, post))
-    
-    # Sort by score (highest first)
-    scored_posts.sort(key=lambda x: x[0], reverse=True)
-    
-    return scored_posts[0][1]  # Return the best post
+    # max keeps the first of any tied posts, as the stable sort used to
+    return max(posts, key=_score)
 
 def remove_duplicates(dry_run=True):
     """Remove duplicate posts from the database"""
@@ -213,11 +206,10 @@ def remove_duplicates(dry_run=True):
     if not dry_run and posts_to_delete:
         print("\n🗑️  Deleting duplicate posts...")
         db = CoffeeDatabase()
-        for post_id in posts_to_delete:
-            db.cursor.execute('DELETE FROM posts WHERE id = ?', (post_id,))
-            print(f"  Deleted post ID {post_id}")
-        db.conn.commit()
-        print(f"✅ Deleted {len(posts_to_delete)} duplicate posts")
+        # One bulk DELETE per chunk of ids, all in a single transaction
+        deleted = db.delete_posts(posts_to_delete)
+        print(f"  Deleted post IDs {', '.join(map(str, posts_to_delete))}")
+        print(f"✅ Deleted {deleted} duplicate posts")
     elif dry_run:
         print("\n⚠️  DRY RUN - No posts were deleted")
         print("Run with --no-dry-run to actually delete duplicates")
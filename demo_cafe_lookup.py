@@ -5,45 +5,72 @@ Demo cafe lookup for posts with missing location data
 
 import json
 import re
+import time
+import atexit
 import urllib.request
 import urllib.parse
 from pathlib import Path
 
+# ijson streams the Instagram export so only coffee posts are ever kept in memory
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+# Geocoding results persist here between runs, keyed by normalized location
+GEOCODE_CACHE_FILE = Path('.geocode_cache.json')
+
+# Nominatim's usage policy allows at most one request per second
+NOMINATIM_INTERVAL = 1.0
+
+NOMINATIM_SEARCH_URL = 'https://nominatim.openstreetmap.org/search'
+# Query parameters shared by every search, encoded once; only q varies
+_NOMINATIM_PARAMS = '&' + urllib.parse.urlencode({'format': 'json', 'limit': 1, 'addressdetails': 1})
+
+_geocode_cache = None
+_last_geocode_request = 0.0
+
+# Coffee tour hashtags and spellings, matched in a single scan of each title
+_COFFEE_HASHTAGS = (
+    '#worldcoffeetour', '#worldcofeetour', '#world_coffee_tour',
+    '#worldcoffee', '#cofeetour', 'worldcoffeetour', 'world coffee tour'
+)
+_COFFEE_TAG_RE = re.compile('|'.join(re.escape(hashtag) for hashtag in _COFFEE_HASHTAGS))
+
 def load_posts():
     """Load Instagram export posts"""
-    with open('instagram-export-folder/your_instagram_activity/media/posts_1.json', 'r', encoding='utf-8') as f:
-        posts = json.load(f)
-    
-    # Find coffee posts
     coffee_posts = []
-    coffee_hashtags = [
-        '#worldcoffeetour', '#worldcofeetour', '#world_coffee_tour',
-        '#worldcoffee', '#cofeetour', 'worldcoffeetour', 'world coffee tour'
-    ]
     
-    for post in posts:
-        title = post.get('title', '').lower()
-        if any(hashtag in title for hashtag in coffee_hashtags):
-            coffee_posts.append(post)
+    with open('instagram-export-folder/your_instagram_activity/media/posts_1.json', 'rb') as f:
+        posts = ijson.items(f, 'item', use_float=True) if ijson is not None else json.load(f)
+        
+        # Find coffee posts
+        for post in posts:
+            title = post.get('title', '').lower()
+            if _COFFEE_TAG_RE.search(title):
+                coffee_posts.append(post)
     
     return coffee_posts
 
+# Common patterns
+_LOCATION_PATTERNS = (
+    re.compile(r'([A-Z][a-zA-Z\s]+Coffee)'),  # "[Name] Coffee"
+    re.compile(r'in\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)'),  # "in Location"
+    re.compile(r'at\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)'),  # "at Location"
+    re.compile(r'([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*),\s*([A-Z]{2})'),  # "City, ST"
+)
+
 def extract_locations_from_caption(caption: str):
     """Extract potential location hints from caption"""
     # Look for "Fahrenheit Coffee" in the caption
     locations = []
     
-    # Common patterns
-    patterns = [
-        r'([A-Z][a-zA-Z\s]+Coffee)',  # "[Name] Coffee"
-        r'in\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)',  # "in Location"
-        r'at\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)',  # "at Location"
-        r'([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*),\s*([A-Z]{2})',  # "City, ST"
-    ]
+    # Every pattern needs a capital letter, so an all-lowercase caption has none
+    if caption.islower():
+        return locations
     
-    for pattern in patterns:
-        matches = re.findall(pattern, caption)
-        for match in matches:
+    for pattern in _LOCATION_PATTERNS:
+        for match in pattern.findall(caption):
             if isinstance(match, tuple):
                 locations.extend([m for m in match if m])
             else:
@@ -51,16 +78,46 @@ def extract_locations_from_caption(caption: str):
     
     return locations
 
+def load_geocode_cache():
+    """Load the on-disk geocode cache once, and save it again at exit"""
+    global _geocode_cache
+    if _geocode_cache is None:
+        try:
+            _geocode_cache = json.loads(GEOCODE_CACHE_FILE.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            _geocode_cache = {}
+        atexit.register(save_geocode_cache)
+    return _geocode_cache
+
+def save_geocode_cache():
+    """Write the geocode cache back to disk"""
+    if _geocode_cache:
+        GEOCODE_CACHE_FILE.write_text(json.dumps(_geocode_cache, indent=2), encoding='utf-8')
+
 def geocode_location(location: str):
-    """Simple geocoding test"""
+    """Simple geocoding test, answered from the cache when the location was seen before"""
+    cache = load_geocode_cache()
+    key = location.strip().lower()
+    if key in cache:
+        return cache[key]
+    
+    # Only real requests are rate limited
+    global _last_geocode_request
+    wait = NOMINATIM_INTERVAL - (time.monotonic() - _last_geocode_request)
+    if wait > 0:
+        time.sleep(wait)
+    _last_geocode_request = time.monotonic()
+    
+    result = _fetch_geocode(location)
+    # Failures aren't cached, since they may just be network errors
+    if result is not None:
+        cache[key] = result
+    return result
+
+def _fetch_geocode(location: str):
+    """Look a location up with Nominatim"""
     try:
-        params = urllib.parse.urlencode({
-            'q': location,
-            'format': 'json',
-            'limit': 1,
-            'addressdetails': 1
-        })
-        url = f"https://nominatim.openstreetmap.org/search?{params}"
+        url = f"{NOMINATIM_SEARCH_URL}?q={urllib.parse.quote_plus(location)}{_NOMINATIM_PARAMS}"
         
         req = urllib.request.Request(url)
         req.add_header('User-Agent', 'WorldCoffeeTour/1.0 (demo)')
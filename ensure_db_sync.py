@@ -8,30 +8,33 @@ import os
 import sys
 from pathlib import Path
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from coffee_db import CoffeeDatabase
 
-def clean_posts_directory():
-    """Remove all existing Jekyll posts"""
-    posts_dir = Path('_coffee_posts')
+# Number of Jekyll post files written in parallel
+WRITE_WORKERS = 16
+
+def clean_posts_directory(posts_dir, existing, keep):
+    """Back up the posts directory, then remove posts the database no longer produces
     
-    if posts_dir.exists():
-        print(f"🧹 Cleaning existing posts directory: {posts_dir}")
-        
-        # Create backup
+    existing maps filenames to paths of the .md files already in posts_dir;
+    files named in keep are left for the sync to update in place.
+    """
+    print(f"🧹 Cleaning existing posts directory: {posts_dir}")
+    
+    # Create backup
+    if existing:
         backup_dir = Path(f'_coffee_posts_backup_{datetime.now().strftime("%Y%m%d_%H%M%S")}')
-        if posts_dir.exists():
-            shutil.copytree(posts_dir, backup_dir)
-            print(f"📦 Backup created: {backup_dir}")
-        
-        # Remove all .md files
-        for md_file in posts_dir.glob('*.md'):
-            md_file.unlink()
-            
-        print(f"✅ Cleaned {len(list(posts_dir.glob('*.md')))} existing posts")
-    else:
-        posts_dir.mkdir(exist_ok=True)
-        print(f"📁 Created posts directory: {posts_dir}")
+        shutil.copytree(posts_dir, backup_dir)
+        print(f"📦 Backup created: {backup_dir}")
+    
+    # Remove stale .md files
+    stale = existing.keys() - keep
+    for name in stale:
+        existing[name].unlink()
+    
+    print(f"✅ Cleaned {len(stale)} stale posts")
 
 def yaml_safe_string(value):
     """Make a string safe for YAML"""
@@ -58,6 +61,16 @@ def yaml_safe_string(value):
     
     return value
 
+def front_matter_lines(front_matter):
+    """Yield the YAML lines for front matter, writing lists one item per line"""
+    for key, value in front_matter.items():
+        if isinstance(value, list):
+            yield f'{key}:'
+            for item in value:
+                yield f'  - {yaml_safe_string(item)}'
+        else:
+            yield f'{key}: {value}'
+
 def create_post_content(post):
     """Create Jekyll post content from database post"""
     # Parse images if they're JSON
@@ -102,28 +115,14 @@ def create_post_content(post):
     if post.get('instagram_url'):
         front_matter['instagram_url'] = yaml_safe_string(post['instagram_url'])
     
-    # Build content
-    content_lines = ['---']
-    
-    # Add front matter
-    for key, value in front_matter.items():
-        if key == 'images' and isinstance(value, list):
-            content_lines.append(f'{key}:')
-            for img in value:
-                content_lines.append(f'  - {yaml_safe_string(img)}')
-        else:
-            content_lines.append(f'{key}: {value}')
-    
-    content_lines.append('---')
-    content_lines.append('')
-    
     # Add post content (notes)
     if post.get('notes'):
-        content_lines.append(str(post['notes']))
+        body = str(post['notes'])
     else:
-        content_lines.append(f"Coffee post from {post.get('city', 'Unknown')}, {post.get('country', 'Unknown')}")
+        body = f"Coffee post from {post.get('city', 'Unknown')}, {post.get('country', 'Unknown')}"
     
-    return '\\n'.join(content_lines)
+    # Build content in a single join
+    return '\n'.join(('---', *front_matter_lines(front_matter), '---', '', body))
 
 def generate_filename(post):
     """Generate Jekyll filename from post data"""
@@ -141,8 +140,27 @@ def generate_filename(post):
     
     return f"{date}-{slug}-{post_id}.md"
 
-def sync_posts_to_jekyll():
-    """Synchronize all database posts to Jekyll"""
+def write_post_file(task):
+    """Write one Jekyll post file unless it already has this content
+    
+    Returns 'written' or 'unchanged', or None if the write failed.
+    """
+    filepath, content, post_id, exists = task
+    try:
+        if exists and filepath.read_bytes() == content:
+            return 'unchanged'
+        filepath.write_bytes(content)
+        return 'written'
+    except Exception as e:
+        print(f"\n❌ Error creating post {post_id}: {e}")
+        return None
+
+def sync_posts_to_jekyll(clean=False):
+    """Synchronize all database posts to Jekyll
+    
+    With clean=True the posts directory is backed up and any post the
+    database doesn't produce is removed first.
+    """
     print("🔄 Synchronizing database posts to Jekyll...")
     
     db = CoffeeDatabase()
@@ -151,32 +169,52 @@ def sync_posts_to_jekyll():
     print(f"📊 Found {len(posts)} posts in database")
     
     posts_dir = Path('_coffee_posts')
-    posts_dir.mkdir(exist_ok=True)
+    if not posts_dir.exists():
+        posts_dir.mkdir()
+        print(f"📁 Created posts directory: {posts_dir}")
     
     created_count = 0
+    unchanged_count = 0
     error_count = 0
     
+    # Render every post up front
+    targets = {}
     for post in posts:
         try:
             filename = generate_filename(post)
-            filepath = posts_dir / filename
-            
-            content = create_post_content(post)
-            
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(content)
-            
-            created_count += 1
-            
-            if created_count % 10 == 0:
-                print(f"   Created {created_count}/{len(posts)} posts...", end='\\r')
-                
+            targets[filename] = (create_post_content(post).encode('utf-8'), post.get('id', 'unknown'))
         except Exception as e:
-            print(f"\\n❌ Error creating post {post.get('id', 'unknown')}: {e}")
+            print(f"\n❌ Error creating post {post.get('id', 'unknown')}: {e}")
             error_count += 1
     
-    print(f"\\n✅ Synchronization complete!")
+    # One directory scan serves both the clean and the unchanged-file check
+    existing = {path.name: path for path in posts_dir.glob('*.md')}
+    if clean:
+        clean_posts_directory(posts_dir, existing, targets.keys())
+    
+    # Overlap the file writes on a thread pool, skipping files already up to date
+    tasks = [
+        (posts_dir / filename, content, post_id, filename in existing)
+        for filename, (content, post_id) in targets.items()
+    ]
+    with ThreadPoolExecutor(max_workers=WRITE_WORKERS) as executor:
+        for result in executor.map(write_post_file, tasks):
+            if result is None:
+                error_count += 1
+                continue
+            
+            if result == 'unchanged':
+                unchanged_count += 1
+            else:
+                created_count += 1
+            
+            synced = created_count + unchanged_count
+            if synced % 10 == 0:
+                print(f"   Synced {synced}/{len(posts)} posts...", end='\r')
+    
+    print(f"\n✅ Synchronization complete!")
     print(f"   📝 Created: {created_count} Jekyll posts")
+    print(f"   ⏭️  Unchanged: {unchanged_count} Jekyll posts")
     if error_count > 0:
         print(f"   ❌ Errors: {error_count} posts")
     
@@ -185,7 +223,7 @@ def sync_posts_to_jekyll():
 
 def verify_sync():
     """Verify that Jekyll posts match database"""
-    print("\\n🔍 Verifying synchronization...")
+    print("\n🔍 Verifying synchronization...")
     
     db = CoffeeDatabase()
     db_posts = db.get_all_posts()
@@ -222,7 +260,7 @@ Usage:
     python3 ensure_db_sync.py [--clean] [--verify-only] [--stats-only]
 
 Options:
-    --clean       Clean all existing Jekyll posts before sync
+    --clean       Back up and remove Jekyll posts not in the database
     --verify-only Only verify sync, don't regenerate
     --stats-only  Only show database statistics
     --help        Show this help message
@@ -231,7 +269,7 @@ This script ensures that Jekyll posts are 100% synchronized with the SQLite data
 It can be run repeatedly and is idempotent (safe to run multiple times).
 
 The script will:
-1. Clean existing Jekyll posts (if --clean specified)
+1. Clean stale Jekyll posts (if --clean specified)
 2. Generate Jekyll posts for all database entries
 3. Handle multiple images per post
 4. Preserve published/unpublished status
@@ -258,22 +296,18 @@ The script will:
         verify_sync()
         return
     
-    # Clean if requested
-    if '--clean' in sys.argv:
-        clean_posts_directory()
-    
-    # Sync posts
-    created, errors = sync_posts_to_jekyll()
+    # Sync posts, cleaning stale ones first if requested
+    created, errors = sync_posts_to_jekyll(clean='--clean' in sys.argv)
     
     # Verify
     verify_sync()
     
     if errors == 0:
-        print("\\n🎉 All posts successfully synchronized!")
-        print("\\n💡 Jekyll posts are now 100% generated from SQLite database")
+        print("\n🎉 All posts successfully synchronized!")
+        print("\n💡 Jekyll posts are now 100% generated from SQLite database")
         print("   You can run this script anytime to ensure sync")
     else:
-        print(f"\\n⚠️  Sync completed with {errors} errors")
+        print(f"\n⚠️  Sync completed with {errors} errors")
         sys.exit(1)
 
 if __name__ == "__main__":
@@ -33,10 +33,8 @@ def extract_cafe_name_from_content(notes, title):
 
 def fix_generic_titles():
     db = CoffeeDatabase()
-    posts = db.get_all_posts()
-    
     generic_titles = ['Worldcoffeetour', 'Tinaaluu', 'None', 'worldcoffeetour', 'tinaaluu', None]
-    posts_to_fix = [p for p in posts if p.get('cafe_name') in generic_titles or p.get('title') in generic_titles]
+    posts_to_fix = [p for p in db.iter_all_posts() if p.get('cafe_name') in generic_titles or p.get('title') in generic_titles]
     
     print(f"Found {len(posts_to_fix)} posts with generic titles to fix")
     
@@ -18,15 +18,21 @@ def parse_front_matter(content):
     if end_pos == -1:
         return {}, content
     
-    front_matter_text = content[4:end_pos]
     body = content[end_pos + 5:]
     
-    # Parse YAML manually (simple key: value parsing)
+    # Parse YAML manually (simple key: value parsing), walking the line
+    # boundaries in place rather than splitting the header into a list
     front_matter = {}
     current_list_key = None
     
-    for line in front_matter_text.split('\n'):
-        line = line.strip()
+    line_start = 4
+    while line_start < end_pos:
+        line_end = content.find('\n', line_start, end_pos)
+        if line_end == -1:
+            line_end = end_pos
+        line = content[line_start:line_end].strip()
+        line_start = line_end + 1
+        
         if not line or line.startswith('#'):
             continue
         
@@ -42,8 +48,8 @@ def parse_front_matter(content):
             continue
         
         # Handle key: value pairs
-        if ':' in line:
-            key, value = line.split(':', 1)
+        key, colon, value = line.partition(':')
+        if colon:
             key = key.strip()
             value = value.strip()
             
@@ -137,6 +143,7 @@ def main():
     
     imported_count = 0
     updated_count = 0
+    unchanged_count = 0
     error_count = 0
     
     for post_file in post_files:
@@ -149,6 +156,8 @@ def main():
             elif result == 'updated':
                 updated_count += 1
                 print(f"   🔄 Updated: {post_file.name}")
+            elif result == 'unchanged':
+                unchanged_count += 1
         else:
             error_count += 1
             print(f"   ❌ Error: {result}")
@@ -159,6 +168,7 @@ def main():
     print(f"\n📊 Import Summary:")
     print(f"   ✅ New posts imported: {imported_count}")
     print(f"   🔄 Posts updated: {updated_count}")
+    print(f"   ⏭️  Posts unchanged: {unchanged_count}")
     print(f"   ❌ Errors: {error_count}")
     print(f"\n📈 Database Statistics:")
     print(f"   📄 Total posts: {stats['total_posts']}")
@@ -9,6 +9,18 @@ import os
 from pathlib import Path
 from datetime import datetime
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Correction columns returned by get_corrections (bookkeeping timestamps excluded)
+CORRECTION_FIELDS = (
+    'cafe_name', 'city', 'country', 'continent', 'latitude', 'longitude',
+    'notes', 'rating', 'published'
+)
+_SELECT_ALL_CORRECTIONS = f"SELECT post_id, {', '.join(CORRECTION_FIELDS)} FROM corrections"
+
 class PostCorrectionsDB:
     def __init__(self, db_path="post_corrections.db"):
         self.db_path = db_path
@@ -93,16 +105,9 @@ class PostCorrectionsDB:
             conn.close()
             return None
         else:
-            cursor.execute('SELECT * FROM corrections')
-            rows = cursor.fetchall()
-            columns = [description[0] for description in cursor.description]
-            result = {}
-            for row in rows:
-                row_dict = dict(zip(columns, row))
-                post_id = row_dict.pop('post_id')
-                row_dict.pop('created_at', None)
-                row_dict.pop('updated_at', None)
-                result[post_id] = row_dict
+            # One query for every row; only the correction columns are fetched
+            rows = cursor.execute(_SELECT_ALL_CORRECTIONS).fetchall()
+            result = {row[0]: dict(zip(CORRECTION_FIELDS, row[1:])) for row in rows}
             conn.close()
             return result
     
@@ -117,12 +122,14 @@ class PostCorrectionsDB:
     def export_to_json(self):
         """Export corrections to JSON format (for compatibility)"""
         corrections = self.get_corrections()
+        if orjson is not None:
+            return orjson.dumps(corrections, option=orjson.OPT_INDENT_2).decode('utf-8')
         return json.dumps(corrections, indent=2)
     
     def import_from_json(self, json_data):
-        """Import corrections from JSON format"""
-        if isinstance(json_data, str):
-            corrections_data = json.loads(json_data)
+        """Import corrections from JSON format (str, bytes, or an already-parsed dict)"""
+        if isinstance(json_data, (str, bytes)):
+            corrections_data = orjson.loads(json_data) if orjson is not None else json.loads(json_data)
         else:
             corrections_data = json_data
         
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Shared helpers for reading, writing and validating coffee post files
+"""
+
+import re
+import os
+import shutil
+import functools
+from pathlib import Path
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+# ftfy repairs mojibake far more thoroughly than the tables below, which are
+# only used when it isn't installed
+try:
+    from ftfy import fix_encoding
+except ImportError:
+    fix_encoding = None
+
+_TIMESTAMP_RE = re.compile(r'-(\d{10})\.md$')
+_KEY_TIMESTAMP_RE = re.compile(r'(?=(\d{10}))')
+
+# Fix UTF-8 encoding issues - handle byte sequences
+_BYTE_REPLACEMENTS = {
+    '\u0080\u0099': "'",  # I€™ve -> I've
+    '\u0080\u009c': '"',  # Left double quote
+    '\u0080\u009d': '"',  # Right double quote
+    '\u0080\u0094': '-',  # Em dash
+    '\u0080\u0093': '-',  # En dash
+    'â\u0080\u0099': "'", # Another variant
+    'â\u0080\u009c': '"',
+    'â\u0080\u009d': '"',
+    'â\u0080\u0094': '-',
+    'â\u0080\u0093': '-',
+}
+
+# Handle common character encoding problems from Instagram export
+_CHAR_REPLACEMENTS = {
+    'Â': '',           # Â is often a stray character
+    'Ã¡': 'a',         # á encoded incorrectly
+    'Ã©': 'e',         # é encoded incorrectly
+    'Ã­': 'i',         # í encoded incorrectly
+    'Ã³': 'o',         # ó encoded incorrectly
+    'Ãº': 'u',         # ú encoded incorrectly
+    'Ã±': 'ñ',         # ñ encoded incorrectly
+}
+
+# Both tables applied in one left-to-right pass; longest match wins so the
+# 'â\u0080\u0099' variants are replaced whole rather than piecemeal.
+_REPLACEMENTS = {**_BYTE_REPLACEMENTS, **_CHAR_REPLACEMENTS}
+_REPLACEMENTS_RE = re.compile('|'.join(
+    re.escape(wrong) for wrong in sorted(_REPLACEMENTS, key=len, reverse=True)
+))
+# Telltale signs of UTF-8 text decoded as Latin-1 ('Ã', 'Â', or the C1 byte
+# in 'â\x80'); only strings showing one are repaired, so correctly encoded
+# text is never touched
+_MOJIBAKE_RE = re.compile('Ã|Â|\x80')
+# Plain scalars YAML would not read back verbatim: quotes, colons, newlines,
+# C1 control bytes left by mojibake, a leading indicator character, a ' #'
+# comment, or surrounding whitespace
+_NEEDS_QUOTES_RE = re.compile(r'["\':\n\x7f-\x9f]|\A[-?,\[\]{}#&*!|>%@`\s]|\s#|\s\Z')
+# Characters that must be escaped inside a double-quoted scalar
+_QUOTED_ESCAPES_RE = re.compile(r'[\\"\n\x7f-\x9f]')
+_QUOTED_ESCAPES = {'\\': '\\\\', '"': '\\"', '\n': '\\n'}
+# Plain scalars such as 'Yes', 'null' or '1.10' resolve to bools, nulls and
+# numbers on load; dates are left alone since they are written back unchanged
+_RESOLVER = yaml.resolver.Resolver()
+_STRING_TAGS = frozenset(('tag:yaml.org,2002:str', 'tag:yaml.org,2002:timestamp'))
+# Control characters other than tab and newline make Jekyll reject the YAML
+_CONTROL_CHARS_RE = re.compile(r'[\x00-\x08\x0b-\x1f]')
+
+def yaml_safe_string(text):
+    """Make a string safe for YAML by properly escaping it"""
+    if not text:
+        return '""'
+    
+    # Clean up the text first
+    return _yaml_safe_str(str(text))
+
+# City, country and continent values repeat across many posts, so the
+# cleaned and quoted form of each distinct string is only worked out once
+@functools.lru_cache(maxsize=8192)
+def _yaml_safe_str(text):
+    # Fix UTF-8 and character encoding issues from Instagram export - every
+    # pattern contains a non-ASCII character, so pure ASCII needs no scan
+    if not text.isascii() and _MOJIBAKE_RE.search(text):
+        if fix_encoding is not None:
+            text = fix_encoding(text)
+        else:
+            text = _REPLACEMENTS_RE.sub(lambda m: _REPLACEMENTS[m.group(0)], text)
+    
+    # Handle quotes and special characters for YAML
+    if (_NEEDS_QUOTES_RE.search(text)
+            or _RESOLVER.resolve(yaml.ScalarNode, text, (True, False)) not in _STRING_TAGS):
+        # Escape backslashes, internal quotes, newlines and control bytes and wrap in quotes
+        escaped = _QUOTED_ESCAPES_RE.sub(
+            lambda m: _QUOTED_ESCAPES.get(m.group(0)) or f'\\x{ord(m.group(0)):02x}', text
+        )
+        return f'"{escaped}"'
+    
+    return text
+
+def index_corrections_by_timestamp(corrections):
+    """Map every 10-digit run found in a correction key to the first key containing it"""
+    by_timestamp = {}
+    for correction_key in corrections:
+        for timestamp in _KEY_TIMESTAMP_RE.findall(correction_key):
+            by_timestamp.setdefault(timestamp, correction_key)
+    return by_timestamp
+
+def find_correction_key(post_file, corrections, by_timestamp):
+    """Resolve which correction applies to a post from its filename alone
+    
+    Returns the correction key, or None if the post has no correction.
+    """
+    # Generate post key from URL-like structure
+    post_key = f"coffee/{post_file.stem}"
+    if post_key in corrections:
+        return post_key
+    
+    # Fall back to matching by the timestamp in the filename
+    timestamp_match = _TIMESTAMP_RE.search(post_file.name)
+    if timestamp_match:
+        return by_timestamp.get(timestamp_match.group(1))
+    return None
+
+def get_post_files():
+    """Get all existing post files"""
+    posts_dir = Path("_coffee_posts")
+    if not posts_dir.exists():
+        print("❌ No _coffee_posts directory found!")
+        return []
+    
+    with os.scandir(posts_dir) as entries:
+        return [
+            Path(entry.path) for entry in entries
+            if entry.name.endswith('.md') and entry.is_file(follow_symlinks=False)
+        ]
+
+def load_front_matter(text):
+    """Parse the YAML between the --- markers into a dict"""
+    front_matter = yaml.load(text, Loader=SafeLoader)
+    if not isinstance(front_matter, dict):
+        return {}
+    return front_matter
+
+def write_post(post_file, content):
+    """Write a post as one pre-encoded block; flushing to disk is left to the caller
+    
+    The content goes to a sibling temp file that is renamed over the post, so
+    a crash never leaves a truncated post behind.
+    """
+    tmp_file = post_file.with_suffix('.md.tmp')
+    try:
+        with open(tmp_file, 'wb') as f:
+            f.write(content.encode('utf-8'))
+        # Keep the post's original permissions rather than the umask default
+        shutil.copymode(post_file, tmp_file)
+        os.replace(tmp_file, post_file)
+    except BaseException:
+        tmp_file.unlink(missing_ok=True)
+        raise
+
+def validate_front_matter(front_matter):
+    """Validate a generated front matter block before it is written"""
+    # Check for basic YAML structure
+    if not front_matter.startswith('---\n'):
+        return False, "Missing YAML front matter"
+        
+    # Find end of front matter
+    end_pos = front_matter.find('\n---\n', 4)
+    if end_pos == -1:
+        return False, "Incomplete YAML front matter"
+        
+    # Check for control characters in title and content
+    match = _CONTROL_CHARS_RE.search(front_matter, 0, end_pos + 5)
+    if match:
+        line_start = front_matter.rfind('\n', 0, match.start()) + 1
+        line_end = front_matter.find('\n', match.start())
+        return False, f"Control characters in YAML: {repr(front_matter[line_start:line_end][:50])}"
+            
+    return True, "Valid"
@@ -207,8 +207,7 @@ def clean_orphaned_posts():
         return
     
     # Get all hashes from database
-    db_posts = db.get_all_posts()
-    db_filenames = {post.get('original_filename') for post in db_posts if post.get('original_filename')}
+    db_filenames = {post.get('original_filename') for post in db.iter_all_posts(parse_json=False) if post.get('original_filename')}
     
     # Check all files in directory
     removed_count = 0
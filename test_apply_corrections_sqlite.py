@@ -0,0 +1,17 @@
+from apply_corrections_sqlite import read_post
+
+
+def test_read_post_with_non_ascii_front_matter(tmp_path):
+    post_file = tmp_path / "2019-05-01-cafe-1556668800.md"
+    header = "---\nlayout: post\ntitle: Café in São Paulo ☕\ncity: São Paulo\n---\n"
+    post_file.write_text(header + "Body text ☕\n", encoding="utf-8")
+
+    front_matter, body, old_header = read_post(post_file)
+
+    assert front_matter == {
+        "layout": "post",
+        "title": "Café in São Paulo ☕",
+        "city": "São Paulo",
+    }
+    assert body == "Body text ☕\n"
+    assert old_header == header